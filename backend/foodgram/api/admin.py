@@ -19,9 +19,10 @@ class TagAdmin(admin.ModelAdmin):
 class RecipeAdmin(admin.ModelAdmin):
     list_display = ("id", "author", "name", "show_count_add_to_favorite")
     list_filter = ("author", "name", "tags",)
+    readonly_fields = ("favorites_count", "in_cart_count",)
 
     def show_count_add_to_favorite(self, obj):
-        return obj.favorites.count()
+        return obj.favorites_count
    
 
 @admin.register(Subsribe)
@@ -33,6 +34,7 @@ class SubsribeAdmin(admin.ModelAdmin):
 class CustomUserAdmin(admin.ModelAdmin):
     list_display = ("id", "username",)
     list_filter = ("email", "username")
+    readonly_fields = ("recipes_count",)
 
 
 @admin.register(Favorite)
@@ -0,0 +1,59 @@
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.http import HttpResponse
+from rest_framework.permissions import SAFE_METHODS
+
+from .connections import check_connections
+
+executor = ThreadPoolExecutor(
+    max_workers=settings.ASYNC_READ_THREADS, thread_name_prefix="read-views"
+)
+
+
+def run_view(view, request, *args, **kwargs):
+    close_old_connections()
+    check_connections()
+    try:
+        return render_view(view, request, *args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+def render_view(view, request, *args, **kwargs):
+    recorder = getattr(request, "query_recorder", None)
+    with (connection.execute_wrapper(recorder) if recorder
+          else nullcontext()):
+        response = view(request, *args, **kwargs)
+        if hasattr(response, "render"):
+            response.render()
+        if response.streaming:
+            streamed = response
+            response = HttpResponse(
+                b"".join(streamed.streaming_content),
+                status=streamed.status_code
+            )
+            for header, value in streamed.items():
+                response[header] = value
+    return response
+
+
+def offload_safe_methods(view):
+    write_view = sync_to_async(view, thread_sensitive=True)
+
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method not in SAFE_METHODS:
+            return await write_view(request, *args, **kwargs)
+        context = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(
+            executor, functools.partial(
+                context.run, run_view, view, request, *args, **kwargs)
+        )
+    return wrapper
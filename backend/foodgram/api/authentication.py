@@ -0,0 +1,102 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+from .cache import is_shared_cache
+
+VERSION_KEY = "auth_token_version:{key}"
+TOKEN_KEY = "auth_token:{version}:{key}"
+
+
+class TokenCache:
+    """Ограниченный LRU-кеш токенов с временем жизни записей."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key, version):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            credentials, entry_version, expires = entry
+            if entry_version != version or expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return credentials
+
+    def set(self, key, version, credentials):
+        with self._lock:
+            self._entries[key] = (
+                credentials, version,
+                time.monotonic() + settings.AUTH_TOKEN_CACHE_TIMEOUT
+            )
+            self._entries.move_to_end(key)
+            while len(self._entries) > settings.AUTH_TOKEN_CACHE_SIZE:
+                self._entries.popitem(last=False)
+
+
+token_cache = TokenCache()
+
+
+def get_token_version(key):
+    return cache.get_or_set(
+        VERSION_KEY.format(key=key), lambda: uuid4().hex, None)
+
+
+def invalidate_tokens(keys):
+    keys = list(keys)
+    if keys:
+        transaction.on_commit(lambda: cache.set_many({
+            VERSION_KEY.format(key=key): uuid4().hex for key in keys
+        }, None))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Кеширует токены, только если кеш общий для всех процессов:
+    иначе отзыв токена в одном процессе не увидят остальные.
+    """
+
+    def authenticate_credentials(self, key):
+        if not is_shared_cache():
+            return self.load_credentials(key)
+        version = get_token_version(key)
+        credentials = token_cache.get(key, version)
+        if credentials is None and settings.AUTH_TOKEN_SHARED_CACHE:
+            credentials = cache.get(TOKEN_KEY.format(version=version, key=key))
+            if credentials is not None:
+                token_cache.set(key, version, credentials)
+        if credentials is None:
+            credentials = self.load_credentials(key)
+            token_cache.set(key, version, credentials)
+            if settings.AUTH_TOKEN_SHARED_CACHE:
+                cache.set(TOKEN_KEY.format(version=version, key=key),
+                          credentials, settings.AUTH_TOKEN_CACHE_TIMEOUT)
+        user, token = credentials
+        return copy.copy(user), token
+
+    def load_credentials(self, key):
+        model = self.get_model()
+        try:
+            token = model.objects.select_related("user").defer(
+                "user__recipes_count").get(key=key)
+        except model.DoesNotExist:
+            raise exceptions.AuthenticationFailed(_("Invalid token."))
+
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(
+                _("User inactive or deleted."))
+
+        return token.user, token
@@ -0,0 +1,101 @@
+from django.db import IntegrityError, transaction
+
+from .counters import change_count
+from .models import Cart, CustomUser, Favorite, Recipe, Subsribe
+from .shopping_cart import bump_cart_versions
+from .user_state import invalidate_user_states
+
+RELATIONS = {
+    Favorite: ("recipe_id", Recipe, "favorites_count"),
+    Cart: ("recipe_id", Recipe, "in_cart_count"),
+    Subsribe: ("author_id", CustomUser, None),
+}
+
+
+def relations_changed(model, user_id, target_ids, delta):
+    _, target_model, counter = RELATIONS[model]
+    if target_ids and counter:
+        change_count(target_model.objects.filter(pk__in=target_ids),
+                     counter, delta)
+    if model is Cart:
+        bump_cart_versions((user_id,))
+    invalidate_user_states((user_id,))
+
+
+def get_existing(model, user, ids):
+    field, target_model, _ = RELATIONS[model]
+    found = set(target_model.objects.filter(
+        pk__in=ids).values_list("pk", flat=True))
+    existing = dict(model.objects.filter(
+        user=user, **{f"{field}__in": found}
+    ).values_list(field, "pk").order_by())
+    return found, existing
+
+
+def insert_relations(model, user, field, target_ids):
+    """
+    Вставляет связи одним запросом. Если параллельный запрос уже добавил
+    часть из них, вставляет по одной, чтобы знать, какие созданы.
+    """
+    try:
+        with transaction.atomic():
+            model.objects.bulk_create(
+                model(user=user, **{field: target_id})
+                for target_id in target_ids
+            )
+        return set(target_ids)
+    except IntegrityError:
+        pass
+    created = set()
+    for target_id in target_ids:
+        try:
+            with transaction.atomic():
+                model.objects.bulk_create(
+                    (model(user=user, **{field: target_id}),))
+        except IntegrityError:
+            continue
+        created.add(target_id)
+    return created
+
+
+@transaction.atomic
+def add_relations(model, user, ids):
+    """Создаёт связи пользователя с объектами за постоянное число запросов."""
+    field, _, _ = RELATIONS[model]
+    found, existing = get_existing(model, user, ids)
+    ids = list(dict.fromkeys(ids))
+    statuses = {}
+    new = []
+    for target_id in ids:
+        if target_id not in found:
+            statuses[target_id] = "not_found"
+        elif model is Subsribe and target_id == user.id:
+            statuses[target_id] = "self"
+        elif target_id in existing:
+            statuses[target_id] = "exists"
+        else:
+            new.append(target_id)
+    created = insert_relations(model, user, field, new) if new else set()
+    for target_id in new:
+        statuses[target_id] = "created" if target_id in created else "exists"
+    relations_changed(model, user.id, created, 1)
+    return [{"id": target_id, "status": statuses[target_id]}
+            for target_id in ids]
+
+
+@transaction.atomic
+def remove_relations(model, user, ids):
+    """Удаляет связи; счётчики и кеши обновляют сигналы post_delete."""
+    found, existing = get_existing(model, user, ids)
+    results = []
+    for target_id in dict.fromkeys(ids):
+        if target_id not in found:
+            status = "not_found"
+        elif target_id in existing:
+            status = "deleted"
+        else:
+            status = "missing"
+        results.append({"id": target_id, "status": status})
+    if existing:
+        model.objects.filter(pk__in=existing.values()).delete()
+    return results
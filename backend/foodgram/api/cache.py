@@ -0,0 +1,89 @@
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from rest_framework.response import Response
+
+LOCAL_CACHE_BACKENDS = (
+    "django.core.cache.backends.dummy.DummyCache",
+    "django.core.cache.backends.locmem.LocMemCache",
+)
+VERSION_KEY = "reference_version:{name}"
+RESPONSE_KEY = "reference_response:{name}:{version}:{format}:{path}"
+
+
+def is_shared_cache():
+    """Кеш по умолчанию общий для всех процессов приложения."""
+    return settings.CACHES["default"]["BACKEND"] not in LOCAL_CACHE_BACKENDS
+
+
+def get_version(name):
+    return cache.get_or_set(
+        VERSION_KEY.format(name=name), lambda: str(time.time()), None
+    )
+
+
+def get_etag(key, data):
+    content = json.dumps(data, sort_keys=True, ensure_ascii=False)
+    return quote_etag(hashlib.md5(f"{key}:{content}".encode()).hexdigest())
+
+
+def bump_version(name):
+    cache.set(VERSION_KEY.format(name=name), str(time.time()), None)
+
+
+class CachedResponseMixin:
+    cache_name = None
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().retrieve, request, *args, **kwargs)
+
+    def cached_response(self, view, request, *args, **kwargs):
+        """
+        Без общего кеша версию, сброшенную в другом процессе, не увидеть,
+        поэтому ответ строится заново, а ETag считается по его данным.
+        """
+        if not is_shared_cache():
+            response = view(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            key = (f"{request.accepted_renderer.format}:"
+                   f"{request.get_full_path()}")
+            return self.conditional_response(
+                request, response.data, get_etag(key, response.data))
+        version = get_version(self.cache_name)
+        key = RESPONSE_KEY.format(
+            name=self.cache_name, version=version,
+            format=request.accepted_renderer.format,
+            path=request.get_full_path()
+        )
+        cached = cache.get(key)
+        if cached is None:
+            response = view(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            cached = (response.data, get_etag(key, response.data))
+            cache.set(key, cached, settings.REFERENCE_CACHE_TIMEOUT)
+        data, etag = cached
+        return self.conditional_response(
+            request, data, etag, int(float(version)))
+
+    def conditional_response(self, request, data, etag, last_modified=None):
+        response = get_conditional_response(
+            request._request, etag=etag, last_modified=last_modified,
+            response=Response(data)
+        )
+        response["ETag"] = etag
+        if last_modified is not None:
+            response["Last-Modified"] = http_date(last_modified)
+        response["Vary"] = "Accept"
+        patch_cache_control(response, no_cache=True)
+        return response
@@ -0,0 +1,12 @@
+from django.conf import settings
+from django.db import connections
+
+
+def check_connections(**kwargs):
+    if not settings.DB_CONN_HEALTH_CHECKS:
+        return
+    for connection in connections.all():
+        if (connection.connection is not None
+                and not connection.in_atomic_block
+                and not connection.is_usable()):
+            connection.close()
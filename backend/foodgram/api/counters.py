@@ -0,0 +1,36 @@
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Cart, CustomUser, Favorite, Recipe
+
+COUNTERS = (
+    (Recipe, "favorites_count", Favorite, "recipe"),
+    (Recipe, "in_cart_count", Cart, "recipe"),
+    (CustomUser, "recipes_count", Recipe, "author"),
+)
+
+
+def change_count(queryset, field, delta):
+    if delta < 0:
+        queryset = queryset.filter(**{f"{field}__gte": -delta})
+    return queryset.update(**{field: F(field) + delta})
+
+
+def actual_count(related_model, related_field):
+    return Coalesce(Subquery(
+        related_model.objects.filter(
+            **{related_field: OuterRef("pk")}
+        ).order_by().values(related_field).annotate(
+            total=Count("pk")
+        ).values("total")
+    ), 0)
+
+
+def recount(model, field, related_model, related_field):
+    drifted = list(model.objects.annotate(
+        actual=actual_count(related_model, related_field)
+    ).exclude(**{field: F("actual")}).values_list("pk", flat=True))
+    if drifted:
+        model.objects.filter(pk__in=drifted).update(
+            **{field: actual_count(related_model, related_field)})
+    return len(drifted)
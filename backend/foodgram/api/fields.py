@@ -0,0 +1,94 @@
+import base64
+import binascii
+import io
+import string
+import uuid
+
+from django.conf import settings
+from django.core.files.uploadedfile import (InMemoryUploadedFile,
+                                            TemporaryUploadedFile)
+from rest_framework import serializers
+
+IMAGE_SIGNATURES = (
+    (b"\x89PNG\r\n\x1a\n", "png", "image/png"),
+    (b"\xff\xd8\xff", "jpg", "image/jpeg"),
+    (b"GIF87a", "gif", "image/gif"),
+    (b"GIF89a", "gif", "image/gif"),
+    (b"RIFF", "webp", "image/webp"),
+)
+WHITESPACE = dict.fromkeys(map(ord, string.whitespace))
+
+
+def detect_image_type(head):
+    for signature, extension, content_type in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            if extension == "webp" and head[8:12] != b"WEBP":
+                continue
+            return extension, content_type
+    return None
+
+
+class StreamingBase64ImageField(serializers.ImageField):
+    chunk_size = 64 * 1024
+    default_error_messages = {
+        "invalid_base64": "Картинка должна быть передана в формате base64.",
+        "invalid_type": "Поддерживаются только картинки PNG, JPEG, GIF "
+                        "и WebP.",
+        "max_size": "Размер картинки не должен превышать {max_size} байт.",
+    }
+
+    def to_internal_value(self, data):
+        if not isinstance(data, str):
+            self.fail("invalid_base64")
+        start = 0
+        if data.startswith("data:"):
+            start = data.find(",") + 1
+            if not data.startswith("data:image/") or not start:
+                self.fail("invalid_type")
+        end = len(data)
+        while end > start and data[end - 1] in string.whitespace:
+            end -= 1
+        length = end - start - sum(
+            data.count(char, start, end) for char in string.whitespace)
+        if length % 4:
+            self.fail("invalid_base64")
+        padding = data.count("=", max(start, end - 2), end)
+        size = length // 4 * 3 - padding
+        if size > settings.RECIPE_IMAGE_MAX_SIZE:
+            self.fail("max_size", max_size=settings.RECIPE_IMAGE_MAX_SIZE)
+        chunks = self.decode(data, start, end)
+        head = next(chunks, b"")
+        image_type = detect_image_type(head)
+        if image_type is None:
+            self.fail("invalid_type")
+        extension, content_type = image_type
+        name = f"{uuid.uuid4()}.{extension}"
+        if size <= settings.FILE_UPLOAD_MAX_MEMORY_SIZE:
+            file = InMemoryUploadedFile(
+                io.BytesIO(), None, name, content_type, size, None)
+        else:
+            file = TemporaryUploadedFile(name, content_type, size, None)
+        file.write(head)
+        for chunk in chunks:
+            file.write(chunk)
+        file.seek(0)
+        return super().to_internal_value(file)
+
+    def decode(self, data, start, end):
+        """
+        Декодирует по частям. Переносы строк (MIME) пропускаются,
+        поэтому границы частей выравниваются по четыре символа.
+        """
+        rest = ""
+        for position in range(start, end, self.chunk_size):
+            chunk = rest + data[
+                position:min(position + self.chunk_size, end)
+            ].translate(WHITESPACE)
+            cut = len(chunk) - len(chunk) % 4
+            rest = chunk[cut:]
+            if not cut:
+                continue
+            try:
+                yield base64.b64decode(chunk[:cut], validate=True)
+            except binascii.Error:
+                self.fail("invalid_base64")
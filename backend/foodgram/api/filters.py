@@ -1,8 +1,10 @@
+from django.db.models import Exists, F, OuterRef
 from django_filters.rest_framework import FilterSet, filters
 
 from rest_framework.filters import SearchFilter
 
-from .models import Recipe, CustomUser, Tag
+from .models import Cart, CustomUser, Favorite, Recipe, TagRecipe
+from .search import search_recipes
 
 
 class IngredientSearchFilter(SearchFilter):
@@ -10,12 +12,15 @@ class IngredientSearchFilter(SearchFilter):
 
 
 class RecipeSearchFilter(SearchFilter):
-    search_param = "author"
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if not terms:
+            return queryset
+        return search_recipes(queryset, terms)
 
 
 class TagAndAuthorFilter(FilterSet):
-    tags = filters.AllValuesMultipleFilter(
-        field_name="tagrecipe__tags__slug")
+    tags = filters.CharFilter(method="get_tags")
     author = filters.ModelChoiceFilter(
         queryset=CustomUser.objects.all()
     )
@@ -23,20 +28,40 @@ class TagAndAuthorFilter(FilterSet):
     is_in_shopping_cart = filters.BooleanFilter(
         method="get_is_in_shopping_cart"
     )
+    ordering = filters.ChoiceFilter(
+        choices=(("popular", "По популярности"),),
+        method="get_ordering"
+    )
    
+    def get_tags(self, queryset, name, value):
+        return queryset.filter(Exists(TagRecipe.objects.filter(
+            recipe=OuterRef("pk"),
+            tags__slug__in=self.request.query_params.getlist(name)
+        )))
+
     def get_is_favorited(self, queryset, name, value):
-        user=self.request.user
-        if value:
-            return queryset.filter(favorites__user=user)
-        return queryset
+        user = self.request.user
+        if not value:
+            return queryset
+        if not user.is_authenticated:
+            return queryset.none()
+        return queryset.filter(Exists(Favorite.objects.filter(
+            user=user, recipe=OuterRef("pk"))))
 
     def get_is_in_shopping_cart(self, queryset, name, value):
         user = self.request.user
-        if value:
-            return queryset.filter(in_cart__user=user)
-        return queryset
+        if not value:
+            return queryset
+        if not user.is_authenticated:
+            return queryset.none()
+        return queryset.filter(Exists(Cart.objects.filter(
+            user=user, recipe=OuterRef("pk"))))
     
+    def get_ordering(self, queryset, name, value):
+        return queryset.order_by(
+            F("ranking__popularity").desc(nulls_last=True), "-id")
+
     class Meta:
         model = Recipe
         fields = ("tags", "author", 
-                  "is_favorited", "is_in_shopping_cart")
+                  "is_favorited", "is_in_shopping_cart", "ordering")
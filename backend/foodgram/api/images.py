@@ -0,0 +1,91 @@
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections
+from PIL import Image, ImageOps
+
+from .models import Recipe
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor, _executor_pid
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.IMAGE_WORKERS,
+                thread_name_prefix="recipe-images"
+            )
+            _executor_pid = os.getpid()
+        return _executor
+
+
+def schedule_processing(recipe_id, image_name):
+    get_executor().submit(process_image_safely, recipe_id, image_name)
+
+
+def process_image_safely(recipe_id, image_name):
+    close_old_connections()
+    try:
+        process_image(recipe_id, image_name)
+    except Exception:
+        logger.exception("Не удалось обработать картинку %s", image_name)
+    finally:
+        close_old_connections()
+
+
+def encode(image, size, format, **options):
+    image = image.copy()
+    if size:
+        image.thumbnail(size, Image.LANCZOS)
+    image.info = {}
+    buffer = io.BytesIO()
+    image.save(buffer, format, **options)
+    return ContentFile(buffer.getvalue())
+
+
+def save_variant(field_name, name, content):
+    field = Recipe._meta.get_field(field_name)
+    return field.storage.save(
+        field.generate_filename(None, name), content
+    )
+
+
+def process_image(recipe_id, image_name):
+    """Пересохраняет оригинал без EXIF и создаёт уменьшенные версии."""
+    with default_storage.open(image_name) as file:
+        source = Image.open(file)
+        format = source.format
+        image = ImageOps.exif_transpose(source)
+        image.load()
+    base, extension = os.path.splitext(os.path.basename(image_name))
+    original = save_variant(
+        "image", f"{base}{extension}",
+        encode(image, None, format,
+               **({"quality": 95} if format == "JPEG" else {}))
+    )
+    image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+    thumbnail = save_variant(
+        "image_thumbnail", f"{base}.jpg",
+        encode(image.convert("RGB"), settings.RECIPE_THUMBNAIL_SIZE,
+               "JPEG", quality=85, optimize=True)
+    )
+    webp = save_variant(
+        "image_webp", f"{base}.webp",
+        encode(image, settings.RECIPE_WEBP_SIZE, "WEBP", quality=80)
+    )
+    updated = Recipe.objects.filter(pk=recipe_id, image=image_name).update(
+        image=original, image_thumbnail=thumbnail, image_webp=webp
+    )
+    default_storage.delete(image_name if updated else original)
@@ -0,0 +1,344 @@
+import base64
+import io
+import json
+import math
+import random
+import statistics
+import subprocess
+import time
+from types import SimpleNamespace
+
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.pagination import Cursor
+from rest_framework.test import APIClient
+
+from api.connections import check_connections
+from api.models import (Cart, CustomUser, Favorite, Ingredient,
+                        IngredientRecipe, Recipe, Subsribe, Tag, TagRecipe)
+from api.pagination import LimitCursorPagination
+from api.search import update_search_vectors
+
+TAGS = (("Завтрак", "#E26C2D", "breakfast"),
+        ("Обед", "#49B64E", "lunch"),
+        ("Ужин", "#8775D2", "dinner"))
+DISHES = ("Борщ", "Салат", "Омлет", "Пирог", "Суп", "Рагу", "Каша", "Паста")
+# Сценарии, которые замеряют прежнюю реализацию для сравнения.
+SCENARIO_SETTINGS = {
+    "ingredient_search_db": {"INGREDIENT_SEARCH_INDEX": False},
+}
+
+
+def percentile(values, percent):
+    values = sorted(values)
+    index = min(len(values) - 1, round(percent / 100 * (len(values) - 1)))
+    return values[index]
+
+
+def small_image():
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 64), "orange").save(buffer, "PNG")
+    return ("data:image/png;base64,"
+            + base64.b64encode(buffer.getvalue()).decode())
+
+
+def seed_dataset(rng, users, recipes, ingredients_per_recipe, favorites,
+                 cart, subscriptions):
+    """
+    Заполняет базу пользователями, рецептами, избранным, корзиной и
+    подписками; ингредиенты должны быть загружены заранее.
+    """
+    tags = [Tag.objects.create(name=name, color=color, slug=slug)
+            for name, color, slug in TAGS]
+    password = make_password("benchmark-password")
+    CustomUser.objects.bulk_create(
+        CustomUser(email=f"user{number}@foodgram.ru",
+                   username=f"user{number}", first_name="Имя",
+                   last_name="Фамилия", password=password)
+        for number in range(users)
+    )
+    users = list(CustomUser.objects.order_by("id"))
+    ingredient_ids = list(Ingredient.objects.values_list("id", flat=True))
+    pantry = rng.sample(ingredient_ids, min(len(ingredient_ids), 15))
+    authors = users[:max(1, len(users) // 5)]
+    Recipe.objects.bulk_create(
+        Recipe(author=rng.choice(authors),
+               name=f"{rng.choice(DISHES)} {number}",
+               text="Описание рецепта " * 20,
+               cooking_time=rng.randint(5, 120))
+        for number in range(recipes)
+    )
+    update_search_vectors(Recipe.objects.all())
+    recipe_ids = list(Recipe.objects.values_list("id", flat=True))
+    TagRecipe.objects.bulk_create(
+        TagRecipe(recipe_id=recipe_id, tags=tag_)
+        for recipe_id in recipe_ids
+        for tag_ in rng.sample(tags, rng.randint(1, len(tags)))
+    )
+    IngredientRecipe.objects.bulk_create((
+        IngredientRecipe(recipe_id=recipe_id, ingredient_id=ingredient_id,
+                         amount=rng.randint(1, 500))
+        for recipe_id in recipe_ids
+        for ingredient_id in rng.sample(
+            ingredient_ids, ingredients_per_recipe)
+    ), batch_size=5000)
+    for model, per_user in ((Favorite, favorites), (Cart, cart)):
+        model.objects.bulk_create((
+            model(user=user, recipe_id=recipe_id)
+            for user in users
+            for recipe_id in rng.sample(
+                recipe_ids, min(per_user, len(recipe_ids)))
+        ), batch_size=5000)
+    Subsribe.objects.bulk_create(
+        Subsribe(user=user, author=author)
+        for user in users
+        for author in rng.sample(authors, min(subscriptions, len(authors)))
+        if author != user
+    )
+    return SimpleNamespace(tags=tags, users=users, authors=authors,
+                           recipe_ids=recipe_ids,
+                           ingredient_ids=ingredient_ids, pantry=pantry)
+
+
+class Command(BaseCommand):
+    help = "Замеряет задержки и число запросов основных сценариев API"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=100)
+        parser.add_argument("--recipes", type=int, default=1000)
+        parser.add_argument("--ingredients-per-recipe", type=int, default=8)
+        parser.add_argument("--favorites", type=int, default=30)
+        parser.add_argument("--cart", type=int, default=10)
+        parser.add_argument("--subscriptions", type=int, default=20)
+        parser.add_argument("--feed-follows", type=int, default=0,
+                            help="Дополнительные подписки замеряемого "
+                                 "пользователя для сценария ленты")
+        parser.add_argument("--iterations", type=int, default=20)
+        parser.add_argument("--page-size", type=int, default=6)
+        parser.add_argument("--deep-page", type=int, default=50,
+                            help="Номер страницы для сценариев глубокой "
+                                 "пагинации")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--cold", action="store_true",
+                            help="Очищать кеш перед каждым запросом")
+        parser.add_argument("--conn-max-age", type=int, default=None,
+                            help="Переопределить CONN_MAX_AGE; 0 — новое "
+                                 "соединение на каждый запрос")
+        parser.add_argument("--only", nargs="*", default=None,
+                            help="Запустить только указанные сценарии")
+        parser.add_argument("--output", help="Файл для JSON-отчёта")
+        parser.add_argument("--compare", help="JSON-отчёт для сравнения")
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.random = random.Random(options["seed"])
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False)
+        try:
+            started = time.perf_counter()
+            self.seed()
+            seed_time = time.perf_counter() - started
+            if options["conn_max_age"] is not None:
+                connection.settings_dict["CONN_MAX_AGE"] = (
+                    options["conn_max_age"])
+                connection.close()
+            results = self.run_scenarios()
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+        report = {
+            "meta": {
+                "commit": self.get_commit(),
+                "database": connection.vendor,
+                "dataset": {key: options[key] for key in (
+                    "users", "recipes", "ingredients_per_recipe",
+                    "favorites", "cart", "subscriptions", "feed_follows")},
+                "iterations": options["iterations"],
+                "page_size": options["page_size"],
+                "deep_page": options["deep_page"],
+                "cold": options["cold"],
+                "conn_max_age": connection.settings_dict["CONN_MAX_AGE"],
+                "seed_seconds": round(seed_time, 3),
+            },
+            "scenarios": results,
+        }
+        self.print_report(report)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+        if options["compare"]:
+            with open(options["compare"], encoding="utf-8") as file:
+                self.print_comparison(json.load(file), report)
+
+    def get_commit(self):
+        try:
+            return subprocess.run(
+                ("git", "rev-parse", "--short", "HEAD"),
+                capture_output=True, text=True, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    def seed(self):
+        options = self.options
+        call_command("load_ingredients", stdout=io.StringIO())
+        dataset = seed_dataset(self.random, **{key: options[key] for key in (
+            "users", "recipes", "ingredients_per_recipe", "favorites",
+            "cart", "subscriptions")})
+        self.tags = dataset.tags
+        self.users = dataset.users
+        self.recipe_ids = dataset.recipe_ids
+        ingredient_ids = dataset.ingredient_ids
+        authors = dataset.authors
+        self.pantry = dataset.pantry
+        self.user = self.users[-1]
+        followed = set(Subsribe.objects.filter(
+            user=self.user).values_list("author_id", flat=True))
+        candidates = [user for user in self.users[:-1]
+                      if user.id not in followed]
+        Subsribe.objects.bulk_create(
+            Subsribe(user=self.user, author=author)
+            for author in self.random.sample(
+                candidates, min(options["feed_follows"], len(candidates)))
+        )
+        call_command("recount", stdout=io.StringIO())
+        self.author = authors[0]
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + Token.objects
+                                .create(user=self.user).key)
+        self.recipe_payload = {
+            "name": "Новый рецепт", "text": "Описание", "cooking_time": 10,
+            "image": small_image(), "tags": [self.tags[0].id],
+            "ingredients": [{"id": ingredient_id, "amount": 10}
+                            for ingredient_id in ingredient_ids[:10]],
+        }
+        self.own_recipe_id = self.client.post(
+            "/api/recipes/", self.recipe_payload, format="json").data["id"]
+
+    def get_deep_cursor(self, base_url, page):
+        """Курсор, указывающий на ту же глубину, что и страница page."""
+        offset = (page - 1) * self.options["page_size"]
+        if not offset:
+            return base_url
+        position = Recipe.objects.order_by("-id").values_list(
+            "id", flat=True)[offset - 1]
+        paginator = LimitCursorPagination()
+        paginator.base_url = base_url
+        return paginator.encode_cursor(Cursor(
+            offset=0, reverse=False, position=str(position)))
+
+    def get_scenarios(self):
+        limit = f"limit={self.options['page_size']}"
+        recipe_id = self.recipe_ids[len(self.recipe_ids) // 2]
+        page = min(self.options["deep_page"], max(1, math.ceil(
+            Recipe.objects.count() / self.options["page_size"])))
+        cursor_url = f"/api/recipes/?{limit}&pagination=cursor&count=false"
+        return {
+            "recipes_list": ("get", f"/api/recipes/?{limit}", None),
+            "recipes_list_deep_page": (
+                "get", f"/api/recipes/?{limit}&page={page}", None),
+            "recipes_list_cursor": ("get", cursor_url, None),
+            "recipes_list_deep_cursor": (
+                "get", self.get_deep_cursor(cursor_url, page), None),
+            "recipes_list_tags": (
+                "get", f"/api/recipes/?{limit}&tags=breakfast&tags=lunch",
+                None),
+            "recipes_list_author": (
+                "get", f"/api/recipes/?{limit}&author={self.author.id}",
+                None),
+            "recipes_list_favorited": (
+                "get", f"/api/recipes/?{limit}&is_favorited=1", None),
+            "recipes_list_in_cart": (
+                "get", f"/api/recipes/?{limit}&is_in_shopping_cart=1", None),
+            "recipes_list_all_filters": (
+                "get", f"/api/recipes/?{limit}&tags=dinner&is_favorited=1"
+                       f"&is_in_shopping_cart=1", None),
+            "recipes_search": (
+                "get", f"/api/recipes/?{limit}&search=Борщ", None),
+            "recipes_feed": (
+                "get", f"/api/recipes/feed/?{limit}&count=false", None),
+            "recipes_can_cook": (
+                "get", f"/api/recipes/can_cook/?{limit}&ingredients="
+                       f"{','.join(map(str, self.pantry))}", None),
+            "recipe_detail": ("get", f"/api/recipes/{recipe_id}/", None),
+            "recipe_create": ("post", "/api/recipes/", self.recipe_payload),
+            "recipe_update": (
+                "patch", f"/api/recipes/{self.own_recipe_id}/",
+                self.recipe_payload),
+            "subscriptions": (
+                "get", f"/api/users/subscriptions/?{limit}&recipes_limit=3",
+                None),
+            "ingredient_search": ("get", "/api/ingredients/?name=мол", None),
+            "ingredient_search_db": (
+                "get", "/api/ingredients/?name=мол", None),
+            "tags_list": ("get", "/api/tags/", None),
+            "shopping_cart_download": (
+                "get", "/api/recipes/download_shopping_cart/", None),
+        }
+
+    def run_scenarios(self):
+        results = {}
+        for name, (method, url, payload) in self.get_scenarios().items():
+            if self.options["only"] and name not in self.options["only"]:
+                continue
+            with override_settings(**SCENARIO_SETTINGS.get(name, {})):
+                results[name] = self.measure(method, url, payload)
+        return results
+
+    def measure(self, method, url, payload):
+        timings = []
+        queries = []
+        status_code = None
+        request = getattr(self.client, method)
+        for _ in range(self.options["iterations"]):
+            if self.options["cold"]:
+                cache.clear()
+            with CaptureQueriesContext(connection) as context:
+                started = time.perf_counter()
+                close_old_connections()
+                check_connections()
+                response = request(url, payload, format="json")
+                if response.streaming:
+                    b"".join(response.streaming_content)
+                close_old_connections()
+                timings.append((time.perf_counter() - started) * 1000)
+            queries.append(len(context.captured_queries))
+            status_code = response.status_code
+        return {
+            "status": status_code,
+            "p50_ms": round(percentile(timings, 50), 3),
+            "p90_ms": round(percentile(timings, 90), 3),
+            "p99_ms": round(percentile(timings, 99), 3),
+            "mean_ms": round(statistics.mean(timings), 3),
+            "queries": round(statistics.median(queries)),
+            "max_queries": max(queries),
+        }
+
+    def print_report(self, report):
+        self.stdout.write(
+            f"{'сценарий':<28}{'код':>5}{'p50':>10}{'p90':>10}"
+            f"{'p99':>10}{'запросы':>9}")
+        for name, result in report["scenarios"].items():
+            self.stdout.write(
+                f"{name:<28}{result['status']:>5}{result['p50_ms']:>10}"
+                f"{result['p90_ms']:>10}{result['p99_ms']:>10}"
+                f"{result['queries']:>9}")
+
+    def print_comparison(self, before, after):
+        self.stdout.write(
+            f"\nСравнение с {before['meta'].get('commit')}:")
+        for name, result in after["scenarios"].items():
+            previous = before["scenarios"].get(name)
+            if previous is None:
+                continue
+            change = ((result["p50_ms"] - previous["p50_ms"])
+                      / previous["p50_ms"] * 100 if previous["p50_ms"] else 0)
+            self.stdout.write(
+                f"{name:<28}p50 {previous['p50_ms']:>9} -> "
+                f"{result['p50_ms']:>9} ({change:+.1f}%), запросы "
+                f"{previous['queries']} -> {result['queries']}")
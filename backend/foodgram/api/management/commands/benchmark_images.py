@@ -0,0 +1,58 @@
+import base64
+import io
+import os
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from drf_extra_fields.fields import Base64ImageField
+from PIL import Image
+
+from api.fields import StreamingBase64ImageField
+
+
+class Command(BaseCommand):
+    help = ("Замеряет пиковую память и время разбора картинки в base64 "
+            "потоковым полем и Base64ImageField")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--size", type=int, default=10,
+                            help="Размер картинки в мегабайтах")
+        parser.add_argument("--wrapped", action="store_true",
+                            help="Переносить base64 по 76 символов, как "
+                                 "в MIME")
+
+    def handle(self, *args, **options):
+        image = self.get_image(options["size"] * 1024 * 1024)
+        encode = base64.encodebytes if options["wrapped"] else base64.b64encode
+        payload = "data:image/png;base64," + encode(image).decode("ascii")
+        self.stdout.write(f"картинка: {len(image) / 2 ** 20:.1f} МБ, "
+                          f"base64: {len(payload) / 2 ** 20:.1f} МБ")
+        self.stdout.write(f"{'поле':<28}{'пик, МБ':>10}{'время, мс':>12}")
+        with override_settings(RECIPE_IMAGE_MAX_SIZE=len(image)):
+            for field in (Base64ImageField(), StreamingBase64ImageField()):
+                peak, elapsed = self.measure(field, payload)
+                self.stdout.write(f"{type(field).__name__:<28}"
+                                  f"{peak / 2 ** 20:>10.1f}"
+                                  f"{elapsed * 1000:>12.0f}")
+
+    def get_image(self, size):
+        """Шум почти не сжимается, поэтому PNG получается нужного размера."""
+        side = int((size / 3) ** 0.5)
+        buffer = io.BytesIO()
+        Image.frombytes("RGB", (side, side), os.urandom(side * side * 3)).save(
+            buffer, "PNG", compress_level=0)
+        return buffer.getvalue()
+
+    def measure(self, field, payload):
+        tracemalloc.start()
+        try:
+            started = time.perf_counter()
+            file = field.to_internal_value(payload)
+            elapsed = time.perf_counter() - started
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        file.close()
+        return peak, elapsed
@@ -0,0 +1,83 @@
+import random
+import statistics
+import time
+
+from django.core.cache import cache
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test.utils import override_settings
+from rest_framework.test import APIClient
+
+from .benchmark import Command as BenchmarkCommand
+
+
+class Command(BenchmarkCommand):
+    help = ("Сверяет ответы быстрых представлений рецептов с сериализаторами "
+            "DRF и замеряет процессорное время на рецепт")
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.random = random.Random(options["seed"])
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False)
+        try:
+            self.seed()
+            mismatches = self.run_comparison()
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+        if mismatches:
+            raise CommandError(
+                "Ответы отличаются: " + ", ".join(mismatches))
+
+    def get_scenarios(self):
+        limit = self.options["page_size"]
+        recipe_id = self.recipe_ids[len(self.recipe_ids) // 2]
+        return {
+            "recipes_list": (f"/api/recipes/?limit={limit}", limit),
+            "recipes_list_search": (
+                f"/api/recipes/?limit={limit}&search=Борщ", limit),
+            "recipes_list_cursor": (
+                f"/api/recipes/?limit={limit}&pagination=cursor"
+                f"&count=false", limit),
+            "recipe_detail": (f"/api/recipes/{recipe_id}/", 1),
+            "recipe_detail_image": (
+                f"/api/recipes/{self.own_recipe_id}/", 1),
+            "subscriptions": (
+                f"/api/users/subscriptions/?limit={limit}&recipes_limit=3",
+                limit),
+        }
+
+    def render(self, client, url, fast):
+        with override_settings(FAST_RECIPE_RENDERING=fast):
+            cache.clear()
+            client.get(url)
+            timings = []
+            for _ in range(self.options["iterations"]):
+                started = time.process_time()
+                response = client.get(url)
+                timings.append(time.process_time() - started)
+        return response, statistics.median(timings)
+
+    def run_comparison(self):
+        clients = {"anonymous": APIClient(), "user": self.client}
+        mismatches = []
+        self.stdout.write(
+            f"{'scenario':<32}{'drf µs/rec':>12}{'fast µs/rec':>13}"
+            f"{'speedup':>9}  match")
+        for name, (url, size) in self.get_scenarios().items():
+            for client_name, client in clients.items():
+                if name == "subscriptions" and client_name == "anonymous":
+                    continue
+                label = f"{name}:{client_name}"
+                slow, slow_time = self.render(client, url, False)
+                fast, fast_time = self.render(client, url, True)
+                match = (slow.status_code == fast.status_code
+                         and slow.content == fast.content)
+                if not match:
+                    mismatches.append(label)
+                self.stdout.write(
+                    f"{label:<32}{slow_time / size * 1e6:>12.0f}"
+                    f"{fast_time / size * 1e6:>13.0f}"
+                    f"{slow_time / fast_time:>8.1f}x  "
+                    f"{'да' if match else 'НЕТ'}")
+        return mismatches
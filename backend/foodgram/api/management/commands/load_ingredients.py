@@ -0,0 +1,78 @@
+import csv
+import json
+import os
+from itertools import islice
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from api.cache import bump_version
+from api.models import Ingredient
+
+DEFAULT_PATH = settings.BASE_DIR.parent.parent / "data" / "ingredients.csv"
+
+
+def read_csv(path):
+    with open(path, encoding="utf-8", newline="") as file:
+        for row in csv.reader(file):
+            if len(row) == 2:
+                yield row[0].strip(), row[1].strip()
+
+
+def read_json(path):
+    with open(path, encoding="utf-8") as file:
+        for item in json.load(file):
+            yield item["title"].strip(), item["dimension"].strip()
+
+
+READERS = {
+    ".csv": read_csv,
+    ".json": read_json,
+}
+
+
+class Command(BaseCommand):
+    help = "Загружает ингредиенты из CSV или JSON файла"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", nargs="?", default=str(DEFAULT_PATH))
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--dry-run", action="store_true")
+
+    def handle(self, path, batch_size, dry_run, **options):
+        reader = READERS.get(path[path.rfind("."):].lower())
+        if reader is None:
+            raise CommandError("Поддерживаются только файлы .csv и .json")
+        if batch_size < 1:
+            raise CommandError("--batch-size должен быть больше 0")
+        if not os.path.isfile(path):
+            raise CommandError(
+                f"Файл {path} не найден, укажите путь к нему явно")
+        seen = set(Ingredient.objects.values_list("name", "measurement_unit"))
+        ingredients = self.new_ingredients(reader(path), seen)
+        self.skipped = total = 0
+        with transaction.atomic():
+            while True:
+                batch = list(islice(ingredients, batch_size))
+                if not batch:
+                    break
+                if not dry_run:
+                    Ingredient.objects.bulk_create(batch, batch_size)
+                total += len(batch)
+                self.stdout.write(f"Обработано новых ингредиентов: {total}")
+        if total and not dry_run:
+            bump_version("ingredients")
+        action = "Будет добавлено" if dry_run else "Добавлено"
+        self.stdout.write(self.style.SUCCESS(
+            f"{action} ингредиентов: {total}, "
+            f"пропущено дубликатов: {self.skipped}"
+        ))
+
+    def new_ingredients(self, rows, seen):
+        for name, measurement_unit in rows:
+            if not name or (name, measurement_unit) in seen:
+                self.skipped += 1
+                continue
+            seen.add((name, measurement_unit))
+            yield Ingredient(name=name, measurement_unit=measurement_unit)
@@ -0,0 +1,81 @@
+import json
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError
+from urllib.parse import quote
+from urllib.request import Request, urlopen
+
+from django.core.management.base import BaseCommand
+
+from .benchmark import percentile
+
+DEFAULT_PATHS = (
+    "/api/recipes/?limit=6",
+    "/api/tags/",
+    "/api/ingredients/?name=мол",
+)
+AUTHENTICATED_PATHS = (
+    "/api/recipes/?limit=6&is_favorited=1",
+    "/api/recipes/download_shopping_cart/",
+)
+
+
+class Command(BaseCommand):
+    help = ("Нагружает запущенный сервер параллельными запросами "
+            "и измеряет пропускную способность")
+
+    def add_arguments(self, parser):
+        parser.add_argument("base_url")
+        parser.add_argument("--token")
+        parser.add_argument("--concurrency", type=int, default=64)
+        parser.add_argument("--requests", type=int, default=2000)
+        parser.add_argument("--timeout", type=float, default=30)
+        parser.add_argument("--path", action="append", dest="paths")
+        parser.add_argument("--label", default="")
+        parser.add_argument("--output", help="Файл для JSON-отчёта")
+
+    def handle(self, base_url, token, concurrency, requests, timeout, paths,
+               label, output, **options):
+        paths = paths or DEFAULT_PATHS + (
+            AUTHENTICATED_PATHS if token else ())
+        headers = {"Authorization": f"Token {token}"} if token else {}
+        urls = [base_url.rstrip("/") + quote(paths[number % len(paths)],
+                                              safe="/?=&")
+                for number in range(requests)]
+
+        def fetch(url):
+            started = time.perf_counter()
+            try:
+                with urlopen(Request(url, headers=headers),
+                             timeout=timeout) as response:
+                    response.read()
+                    status = response.status
+            except HTTPError as error:
+                status = error.code
+            except OSError:
+                status = None
+            return time.perf_counter() - started, status
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(fetch, urls))
+        elapsed = time.perf_counter() - started
+        timings = [duration * 1000 for duration, _ in results]
+        errors = sum(1 for _, status in results
+                     if status is None or status >= 500)
+        report = {
+            "label": label,
+            "concurrency": concurrency,
+            "requests": requests,
+            "errors": errors,
+            "throughput_rps": round(requests / elapsed, 1),
+            "p50_ms": round(percentile(timings, 50), 1),
+            "p90_ms": round(percentile(timings, 90), 1),
+            "p99_ms": round(percentile(timings, 99), 1),
+            "mean_ms": round(statistics.mean(timings), 1),
+        }
+        self.stdout.write(json.dumps(report, ensure_ascii=False))
+        if output:
+            with open(output, "w", encoding="utf-8") as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
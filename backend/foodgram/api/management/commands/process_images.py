@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from api.images import process_image
+from api.models import Recipe
+
+
+class Command(BaseCommand):
+    help = ("Удаляет метаданные из картинок рецептов и создаёт "
+            "миниатюры и WebP-версии")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all", action="store_true",
+            help="Обработать и картинки, у которых уже есть миниатюры")
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(
+            Q(image__isnull=True) | Q(image="")
+        ).values_list("id", "image")
+        if not options["all"]:
+            recipes = recipes.filter(
+                Q(image_thumbnail__isnull=True) | Q(image_thumbnail=""))
+        total = 0
+        for recipe_id, image in recipes.iterator():
+            process_image(recipe_id, image)
+            total += 1
+        self.stdout.write(self.style.SUCCESS(
+            f"Обработано картинок: {total}"))
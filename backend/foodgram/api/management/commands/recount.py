@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.counters import COUNTERS, recount
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает счётчики избранного, корзины и рецептов автора"
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        for model, field, related_model, related_field in COUNTERS:
+            fixed = recount(model, field, related_model, related_field)
+            self.stdout.write(
+                f"{model._meta.verbose_name_plural}.{field}: "
+                f"исправлено {fixed}"
+            )
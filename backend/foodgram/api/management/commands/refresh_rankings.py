@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from api.rankings import refresh_rankings
+
+
+class Command(BaseCommand):
+    help = ("Обновляет рейтинги рецептов по новым записям избранного "
+            "и корзины")
+
+    def handle(self, *args, **options):
+        updated = refresh_rankings()
+        if updated is None:
+            self.stdout.write("Рейтинги уже обновляются другим процессом")
+        else:
+            self.stdout.write(f"Обновлено рейтингов: {updated}")
@@ -1,4 +1,10 @@
 from django.contrib.auth.base_user import BaseUserManager
+from django.db import models
+from django.db.models.functions import RowNumber
+
+# Поля, которых достаточно для краткого представления рецепта.
+MINIFIED_RECIPE_FIELDS = ("id", "author_id", "name", "cooking_time", "image",
+                          "image_thumbnail")
 
 
 class CustomUserManager(BaseUserManager):
@@ -23,3 +29,36 @@ class CustomUserManager(BaseUserManager):
                 "Суперпользователь должен иметь is_superuser=True"
             )
         return self.create_user(email, password, **extra_fields)
+
+
+class RecipeQuerySet(models.QuerySet):
+    def with_related(self):
+        from .models import IngredientRecipe, Tag
+
+        return self.select_related("author").defer(
+            "search_vector"
+        ).prefetch_related(
+            models.Prefetch("tags", queryset=Tag.objects.order_by("id")),
+            models.Prefetch(
+                "ingredientrecipe_set",
+                queryset=IngredientRecipe.objects.select_related(
+                    "ingredient").order_by("id")
+            )
+        )
+
+    def latest_for_authors(self, author_ids, limit=None):
+        queryset = self.filter(author_id__in=author_ids).only(
+            *MINIFIED_RECIPE_FIELDS).order_by("-id")
+        if limit is None:
+            return list(queryset)
+        ranked = queryset.annotate(row_number=models.Window(
+            expression=RowNumber(),
+            partition_by=[models.F("author_id")],
+            order_by=models.F("id").desc(),
+        ))
+        sql, params = ranked.query.sql_with_params()
+        return list(self.raw(
+            f"SELECT * FROM ({sql}) ranked WHERE row_number <= %s "
+            f"ORDER BY id DESC",
+            (*params, limit)
+        ))
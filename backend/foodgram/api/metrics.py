@@ -0,0 +1,226 @@
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import connection
+from django.http import HttpResponse
+from django.utils.deprecation import MiddlewareMixin
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+HISTOGRAMS = {
+    "duration_seconds": DURATION_BUCKETS,
+    "db_duration_seconds": DURATION_BUCKETS,
+    "queries": QUERY_BUCKETS,
+}
+COUNTERS = ("duplicate_queries",)
+PLACEHOLDERS = re.compile(r"%s(\s*,\s*%s)+")
+LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+
+
+def get_shape(sql):
+    return LITERALS.sub("?", PLACEHOLDERS.sub("%s", sql))
+
+
+class QueryRecorder:
+    def __init__(self):
+        self.count = 0
+        self.duration = 0
+        self.statements = Counter()
+        self.shapes = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            self.statements[(sql, repr(params))] += 1
+            self.shapes[get_shape(sql)] += 1
+
+    @property
+    def duplicates(self):
+        return sum(count - 1 for count in self.statements.values())
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.routes = {}
+        self.flushed = 0
+
+    def new_route(self):
+        route = {
+            name: {"buckets": [0] * len(buckets), "sum": 0, "count": 0}
+            for name, buckets in HISTOGRAMS.items()
+        }
+        route.update({name: 0 for name in COUNTERS})
+        return route
+
+    def observe(self, route_name, **values):
+        with self.lock:
+            route = self.routes.setdefault(route_name, self.new_route())
+            for name, buckets in HISTOGRAMS.items():
+                histogram = route[name]
+                for index, bound in enumerate(buckets):
+                    if values[name] <= bound:
+                        histogram["buckets"][index] += 1
+                histogram["sum"] += values[name]
+                histogram["count"] += 1
+            for name in COUNTERS:
+                route[name] += values[name]
+        if (settings.METRICS_DIR and time.monotonic() - self.flushed
+                > settings.METRICS_FLUSH_INTERVAL):
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            snapshot = json.dumps(self.routes)
+            self.flushed = time.monotonic()
+        os.makedirs(settings.METRICS_DIR, exist_ok=True)
+        path = os.path.join(settings.METRICS_DIR, f"{os.getpid()}.json")
+        with open(f"{path}.tmp", "w") as file:
+            file.write(snapshot)
+        os.replace(f"{path}.tmp", path)
+
+    def collect(self):
+        if not settings.METRICS_DIR:
+            with self.lock:
+                return json.loads(json.dumps(self.routes))
+        self.flush()
+        merged = {}
+        for filename in os.listdir(settings.METRICS_DIR):
+            if not filename.endswith(".json"):
+                continue
+            with open(os.path.join(settings.METRICS_DIR, filename)) as file:
+                for route_name, route in json.load(file).items():
+                    self.merge(merged.setdefault(
+                        route_name, self.new_route()), route)
+        return merged
+
+    def merge(self, target, source):
+        for name in HISTOGRAMS:
+            target[name]["buckets"] = [
+                left + right for left, right in zip(
+                    target[name]["buckets"], source[name]["buckets"])
+            ]
+            target[name]["sum"] += source[name]["sum"]
+            target[name]["count"] += source[name]["count"]
+        for name in COUNTERS:
+            target[name] += source[name]
+
+    def render(self):
+        lines = []
+        routes = self.collect()
+        for name, buckets in HISTOGRAMS.items():
+            metric = f"foodgram_request_{name}"
+            lines.append(f"# TYPE {metric} histogram")
+            for route_name, route in sorted(routes.items()):
+                histogram = route[name]
+                for bound, count in zip(buckets, histogram["buckets"]):
+                    lines.append(
+                        f'{metric}_bucket{{route="{route_name}",'
+                        f'le="{bound}"}} {count}')
+                lines.append(f'{metric}_bucket{{route="{route_name}",'
+                             f'le="+Inf"}} {histogram["count"]}')
+                lines.append(f'{metric}_sum{{route="{route_name}"}} '
+                             f'{histogram["sum"]}')
+                lines.append(f'{metric}_count{{route="{route_name}"}} '
+                             f'{histogram["count"]}')
+        for name in COUNTERS:
+            metric = f"foodgram_request_{name}_total"
+            lines.append(f"# TYPE {metric} counter")
+            for route_name, route in sorted(routes.items()):
+                lines.append(
+                    f'{metric}{{route="{route_name}"}} {route[name]}')
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+class RecordedStream:
+    """Потоковый ответ, метрики которого снимаются после отдачи тела."""
+
+    def __init__(self, content, recorder, finish):
+        self.content = content
+        self.recorder = recorder
+        self.finish = finish
+        self.closed = False
+
+    def __iter__(self):
+        if self.recorder not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self.recorder)
+        try:
+            yield from self.content
+        finally:
+            if self.recorder in connection.execute_wrappers:
+                connection.execute_wrappers.remove(self.recorder)
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        if hasattr(self.content, "close"):
+            self.content.close()
+        self.finish()
+
+
+class MetricsMiddleware(MiddlewareMixin):
+    def process_request(self, request):
+        request.query_recorder = QueryRecorder()
+        request.metrics_started = time.perf_counter()
+        connection.execute_wrappers.append(request.query_recorder)
+
+    def process_response(self, request, response):
+        recorder = getattr(request, "query_recorder", None)
+        if recorder is None:
+            return response
+        if recorder in connection.execute_wrappers:
+            connection.execute_wrappers.remove(recorder)
+        if response.streaming:
+            response.streaming_content = RecordedStream(
+                response.streaming_content, recorder,
+                lambda: self.observe(request, recorder)
+            )
+            return response
+        duration = self.observe(request, recorder)
+        response["Server-Timing"] = (
+            f"app;dur={(duration - recorder.duration) * 1000:.1f}, "
+            f"db;dur={recorder.duration * 1000:.1f};"
+            f'desc="queries={recorder.count} '
+            f'duplicates={recorder.duplicates}", '
+            f"total;dur={duration * 1000:.1f}"
+        )
+        return response
+
+    def observe(self, request, recorder):
+        duration = time.perf_counter() - request.metrics_started
+        match = request.resolver_match
+        route = match.url_name if match and match.url_name else "unresolved"
+        registry.observe(
+            route, duration_seconds=duration,
+            db_duration_seconds=recorder.duration, queries=recorder.count,
+            duplicate_queries=recorder.duplicates
+        )
+        for shape, count in recorder.shapes.items():
+            if count > settings.N_PLUS_ONE_THRESHOLD:
+                logger.warning(
+                    "Возможна проблема N+1 в %s: %d одинаковых запросов: %s",
+                    route, count, shape
+                )
+        return duration
+
+
+def metrics(request):
+    return HttpResponse(
+        registry.render(), content_type="text/plain; version=0.0.4"
+    )
@@ -1,15 +1,43 @@
 from django.contrib.auth.models import AbstractUser
+from django.contrib.postgres.search import SearchVectorField
 from django.core import validators
 from django.db import models
+from django.utils import timezone
 
-from .managers import CustomUserManager
+from .managers import CustomUserManager, RecipeQuerySet
 
 
-class CustomUser(AbstractUser):
+class ManagedFieldsMixin:
+    """
+    Поля из managed_fields меняются только запросами через F() и update(),
+    поэтому обычный save() существующей записи их не перезаписывает.
+    """
+
+    managed_fields = ()
+
+    def save(self, force_insert=False, force_update=False, using=None,
+             update_fields=None):
+        if update_fields is None and not force_insert and (
+                not self._state.adding):
+            deferred = self.get_deferred_fields()
+            update_fields = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.managed_fields
+                and field.attname not in deferred
+            ]
+        super().save(force_insert, force_update, using, update_fields)
+
+
+class CustomUser(ManagedFieldsMixin, AbstractUser):
     email = models.EmailField("E-mail", max_length=254, unique=True)
     username = models.CharField("Никнейм", max_length=150)
     first_name = models.CharField("Имя", max_length=150)
     last_name = models.CharField("Фамилия", max_length=150)
+    recipes_count = models.PositiveIntegerField(
+        "Количество рецептов", default=0)
+
+    managed_fields = ("recipes_count",)
 
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = [
@@ -52,13 +80,19 @@ class Tag(models.Model):
         return f"{self.slug}"
 
 
-class Recipe(models.Model):
+class Recipe(ManagedFieldsMixin, models.Model):
     author = models.ForeignKey(CustomUser, on_delete=models.CASCADE, 
                                verbose_name="Автор публикации")
     name = models.CharField(max_length=100, verbose_name="Название")
     image = models.ImageField(upload_to="media/recipes/",
                               blank=True, null=True,
                               verbose_name="Картинка")
+    image_thumbnail = models.ImageField(
+        upload_to="media/recipes/thumbnails/", blank=True, null=True,
+        verbose_name="Миниатюра картинки")
+    image_webp = models.ImageField(
+        upload_to="media/recipes/webp/", blank=True, null=True,
+        verbose_name="Картинка в формате WebP")
     text = models.CharField(max_length=3000, 
                             verbose_name="Текстовое описание")
     cooking_time = models.PositiveSmallIntegerField(
@@ -71,11 +105,23 @@ class Recipe(models.Model):
     )
     tags = models.ManyToManyField(Tag, through="TagRecipe", 
                                   verbose_name="Теги")
+    favorites_count = models.PositiveIntegerField(
+        default=0, verbose_name="Добавлений в избранное")
+    in_cart_count = models.PositiveIntegerField(
+        default=0, verbose_name="Добавлений в корзину")
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    managed_fields = ("favorites_count", "in_cart_count", "search_vector")
+
+    objects = RecipeQuerySet.as_manager()
     
     class Meta:
         ordering = ["-id"]
         verbose_name = "Рецепт"
         verbose_name_plural = "Рецепты"
+        indexes = [
+            models.Index(fields=["author", "-id"],
+                         name="recipe_author_id_idx")]
     
     def __str__(self):
         return f"{self.name}"
@@ -90,6 +136,9 @@ class TagRecipe(models.Model):
     class Meta:
         verbose_name = "Тег рецепта"
         verbose_name_plural = "Теги рецепта"
+        indexes = [
+            models.Index(fields=["tags", "recipe"],
+                         name="tagrecipe_tags_recipe_idx")]
 
 
 class IngredientRecipe(models.Model):
@@ -104,6 +153,9 @@ class IngredientRecipe(models.Model):
     class Meta:
         verbose_name = "Ингридиент и его количество в рецепте"
         verbose_name_plural = "Ингридиенты и их количество в рецептах"
+        indexes = [
+            models.Index(fields=["recipe", "ingredient"],
+                         name="ingredientrecipe_recipe_idx")]
 
     def __str__(self):
         return f"{self.recipe}, {self.ingredient.id}, {self.amount}"
@@ -138,6 +190,8 @@ class Favorite(models.Model):
                                on_delete=models.CASCADE, 
                                related_name="favorites", 
                                verbose_name='Рецепт')
+    created = models.DateTimeField(default=timezone.now,
+                                   verbose_name="Дата добавления")
     
     class Meta:
         ordering = ["-id"]
@@ -158,6 +212,8 @@ class Cart(models.Model):
                                on_delete=models.CASCADE, 
                                related_name="in_cart", 
                                verbose_name='Рецепт')
+    created = models.DateTimeField(default=timezone.now,
+                                   verbose_name="Дата добавления")
     
     class Meta:
         ordering = ["-id"]
@@ -169,3 +225,43 @@ class Cart(models.Model):
     
     def __str__(self):
         return f"{self.user} - {self.recipe}"
+
+
+class RecipeRanking(models.Model):
+    recipe = models.OneToOneField(Recipe, on_delete=models.CASCADE,
+                                  primary_key=True, related_name="ranking",
+                                  verbose_name="Рецепт")
+    popularity = models.PositiveIntegerField(
+        default=0, db_index=True, verbose_name="Популярность")
+    trending = models.PositiveIntegerField(
+        default=0, db_index=True, verbose_name="Популярность за период")
+
+    class Meta:
+        verbose_name = "Рейтинг рецепта"
+        verbose_name_plural = "Рейтинги рецептов"
+
+
+class RecipeActivity(models.Model):
+    recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE,
+                               verbose_name="Рецепт")
+    bucket = models.DateTimeField(db_index=True, verbose_name="Час")
+    score = models.PositiveIntegerField(default=0, verbose_name="Очки")
+
+    class Meta:
+        verbose_name = "Активность по рецепту"
+        verbose_name_plural = "Активность по рецептам"
+        constraints = [
+            models.UniqueConstraint(fields=["recipe", "bucket"],
+                                    name="unique_recipe_activity")]
+
+
+class RankingWatermark(models.Model):
+    favorite_id = models.BigIntegerField(default=0)
+    cart_id = models.BigIntegerField(default=0)
+    favorite_gaps = models.JSONField(default=dict)
+    cart_gaps = models.JSONField(default=dict)
+    refreshed = models.DateTimeField(null=True)
+
+    class Meta:
+        verbose_name = "Отметка пересчёта рейтингов"
+        verbose_name_plural = "Отметки пересчёта рейтингов"
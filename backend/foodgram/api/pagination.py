@@ -1,6 +1,50 @@
-from rest_framework.pagination import PageNumberPagination
+from collections import OrderedDict
+
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.response import Response
 
 
 class LimitPagination(PageNumberPagination):
     page_size = 6
     page_size_query_param = "limit"
+
+
+class LimitCursorPagination(CursorPagination):
+    page_size = 6
+    page_size_query_param = "limit"
+    ordering = "-id"
+    count_query_param = "count"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if queryset.query.order_by and tuple(
+                queryset.query.order_by) != (self.ordering,):
+            raise ValidationError({"pagination": [
+                "Курсорная пагинация несовместима с сортировкой "
+                "по популярности и поиском, используйте постраничную."
+            ]})
+        self.count = None
+        if request.query_params.get(self.count_query_param) != "false":
+            self.count = queryset.count()
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        response = OrderedDict()
+        if self.count is not None:
+            response["count"] = self.count
+        response["next"] = self.get_next_link()
+        response["previous"] = self.get_previous_link()
+        response["results"] = data
+        return Response(response)
+
+
+class PaginationModeMixin:
+    pagination_query_param = "pagination"
+
+    @property
+    def pagination_class(self):
+        request = getattr(self, "request", None)
+        if (request is not None and request.query_params.get(
+                self.pagination_query_param) == "cursor"):
+            return LimitCursorPagination
+        return LimitPagination
@@ -0,0 +1,72 @@
+import threading
+
+from django.conf import settings
+from django.db.backends.postgresql import base
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+
+pools = {}
+pools_lock = threading.Lock()
+
+
+class ConnectionPool:
+    def __init__(self, size):
+        self.size = size
+        self.idle = []
+        self.lock = threading.Lock()
+
+    def get(self):
+        with self.lock:
+            return self.idle.pop() if self.idle else None
+
+    def put(self, connection):
+        with self.lock:
+            if len(self.idle) < self.size:
+                self.idle.append(connection)
+                return True
+        return False
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """Возвращает соединения в общий для потоков пул вместо закрытия."""
+
+    @property
+    def pool(self):
+        key = (self.alias, self.settings_dict["NAME"])
+        with pools_lock:
+            if key not in pools:
+                pools[key] = ConnectionPool(
+                    self.settings_dict.get("POOL_SIZE", settings.DB_POOL_SIZE)
+                )
+            return pools[key]
+
+    def get_new_connection(self, conn_params):
+        while True:
+            connection = self.pool.get()
+            if connection is None:
+                return super().get_new_connection(conn_params)
+            if self.is_reusable(connection):
+                self.isolation_level = connection.isolation_level
+                return connection
+            connection.close()
+
+    def is_reusable(self, connection):
+        if connection.closed:
+            return False
+        if not settings.DB_CONN_HEALTH_CHECKS:
+            return True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+        except self.Database.Error:
+            return False
+        return True
+
+    def _close(self):
+        connection = self.connection
+        if connection is None or connection.closed:
+            return
+        with self.wrap_database_errors:
+            if connection.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+                connection.rollback()
+            if self.errors_occurred or not self.pool.put(connection):
+                connection.close()
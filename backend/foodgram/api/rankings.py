@@ -0,0 +1,207 @@
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from datetime import timedelta
+from itertools import islice
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F, Max, Q, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import (Cart, Favorite, Recipe, RankingWatermark, RecipeActivity,
+                     RecipeRanking)
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 500
+
+_scheduler_pid = None
+_scheduler_lock = threading.Lock()
+
+
+def chunked(values, size=CHUNK_SIZE):
+    values = iter(values)
+    while True:
+        chunk = list(islice(values, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def get_sources():
+    return (
+        (Favorite, "favorite", settings.RANKING_FAVORITE_WEIGHT),
+        (Cart, "cart", settings.RANKING_CART_WEIGHT),
+    )
+
+
+def collect_history(watermark):
+    """
+    Первый пересчёт только ставит отметки: у старых записей created
+    заполнен датой миграции, поэтому в окно трендов они не попадают.
+    """
+    for model, name, _ in get_sources():
+        last_id = model.objects.aggregate(last_id=Max("id"))["last_id"]
+        if last_id is not None:
+            setattr(watermark, f"{name}_id", last_id)
+    return Counter()
+
+
+def get_popularity():
+    """
+    Общая популярность считается по счётчикам рецепта, поэтому удаление
+    из избранного и корзины её уменьшает. Возвращает только рецепты,
+    у которых сохранённое значение устарело.
+    """
+    return dict(Recipe.objects.annotate(
+        score=(F("favorites_count") * settings.RANKING_FAVORITE_WEIGHT
+               + F("in_cart_count") * settings.RANKING_CART_WEIGHT),
+        current=Coalesce("ranking__popularity", 0),
+    ).exclude(score=F("current")).values_list("pk", "score").order_by())
+
+
+def get_gaps(gaps, found, last_seen, last_id, now):
+    """
+    Пропуски в id — строки, которые ещё не закоммичены, откатились или
+    уже удалены. Они перепроверяются, пока не истечёт RANKING_GAP_TIMEOUT.
+    """
+    expires = now.timestamp() - settings.RANKING_GAP_TIMEOUT
+    gaps = {gap_id: seen for gap_id, seen in gaps.items()
+            if int(gap_id) not in found and seen > expires}
+    first_id = max(last_seen, last_id - settings.RANKING_MAX_GAPS - len(
+        found)) + 1
+    gaps.update((str(gap_id), now.timestamp())
+                for gap_id in range(first_id, last_id + 1)
+                if gap_id not in found)
+    if len(gaps) > settings.RANKING_MAX_GAPS:
+        logger.warning("Слишком много пропусков в id: %d", len(gaps))
+        gaps = dict(sorted(gaps.items(), key=lambda item: int(item[0]))[
+            -settings.RANKING_MAX_GAPS:])
+    return gaps
+
+
+def collect_activity(watermark, window_start, now):
+    activity = Counter()
+    for model, name, weight in get_sources():
+        last_seen = getattr(watermark, f"{name}_id")
+        gaps = getattr(watermark, f"{name}_gaps")
+        rows = model.objects.filter(
+            Q(id__gt=last_seen) | Q(id__in=[int(gap) for gap in gaps])
+        ).values_list("id", "recipe_id", "created").order_by()
+        found = set()
+        for row_id, recipe_id, created in rows.iterator():
+            found.add(row_id)
+            bucket = timezone.localtime(created).replace(
+                minute=0, second=0, microsecond=0)
+            if bucket >= window_start:
+                activity[recipe_id, bucket] += weight
+        last_id = max(found | {last_seen})
+        setattr(watermark, f"{name}_gaps",
+                get_gaps(gaps, found, last_seen, last_id, now))
+        setattr(watermark, f"{name}_id", last_id)
+    return activity
+
+
+def save_activity(activity):
+    for keys in chunked(activity):
+        existing = {
+            (row.recipe_id, row.bucket): row
+            for row in RecipeActivity.objects.filter(
+                recipe_id__in={recipe_id for recipe_id, _ in keys},
+                bucket__in={bucket for _, bucket in keys})
+        }
+        changed = []
+        for key in keys:
+            row = existing.get(key)
+            if row is not None:
+                row.score += activity[key]
+                changed.append(row)
+        RecipeActivity.objects.bulk_update(changed, ("score",))
+        RecipeActivity.objects.bulk_create(
+            RecipeActivity(recipe_id=recipe_id, bucket=bucket,
+                           score=activity[recipe_id, bucket])
+            for recipe_id, bucket in keys
+            if (recipe_id, bucket) not in existing
+        )
+
+
+def save_rankings(recipe_ids, popularity, window_start):
+    for chunk in chunked(recipe_ids):
+        existing_ids = set(Recipe.objects.filter(
+            pk__in=chunk).values_list("pk", flat=True))
+        trending = dict(RecipeActivity.objects.filter(
+            recipe_id__in=existing_ids, bucket__gte=window_start
+        ).values("recipe_id").annotate(
+            score=Sum("score")).values_list("recipe_id", "score").order_by())
+        rankings = RecipeRanking.objects.in_bulk(existing_ids)
+        for recipe_id in existing_ids:
+            ranking = rankings.get(recipe_id)
+            if ranking is None:
+                ranking = RecipeRanking(recipe_id=recipe_id)
+            ranking.popularity = popularity.get(
+                recipe_id, ranking.popularity)
+            ranking.trending = trending.get(recipe_id, 0)
+            rankings[recipe_id] = ranking
+        RecipeRanking.objects.bulk_update(
+            [ranking for ranking in rankings.values()
+             if not ranking._state.adding],
+            ("popularity", "trending"))
+        RecipeRanking.objects.bulk_create(
+            ranking for ranking in rankings.values()
+            if ranking._state.adding)
+
+
+def refresh_rankings(now=None):
+    """
+    Дописывает в тренды только новые записи избранного и корзины,
+    а общую популярность сверяет со счётчиками рецептов.
+    """
+    now = now or timezone.now()
+    window_start = now - timedelta(hours=settings.TRENDING_WINDOW_HOURS)
+    RankingWatermark.objects.get_or_create(pk=1)
+    with transaction.atomic():
+        watermark = RankingWatermark.objects.select_for_update(
+            skip_locked=True).filter(pk=1).first()
+        if watermark is None:
+            return None
+        if watermark.refreshed is None:
+            activity = collect_history(watermark)
+        else:
+            activity = collect_activity(watermark, window_start, now)
+        save_activity(activity)
+        popularity = get_popularity()
+        expired = RecipeActivity.objects.filter(bucket__lt=window_start)
+        recipe_ids = set(popularity) | {
+            recipe_id for recipe_id, _ in activity} | set(
+            expired.values_list("recipe_id", flat=True).distinct())
+        expired.delete()
+        save_rankings(recipe_ids, popularity, window_start)
+        watermark.refreshed = now
+        watermark.save()
+    return len(recipe_ids)
+
+
+def run_scheduler():
+    while True:
+        time.sleep(settings.RANKING_REFRESH_INTERVAL)
+        try:
+            refresh_rankings()
+        except Exception:
+            logger.exception("Не удалось обновить рейтинги рецептов")
+        finally:
+            close_old_connections()
+
+
+def start_scheduler():
+    global _scheduler_pid
+    if not settings.RANKING_REFRESH_INTERVAL:
+        return
+    with _scheduler_lock:
+        if _scheduler_pid != os.getpid():
+            threading.Thread(target=run_scheduler, name="recipe-rankings",
+                             daemon=True).start()
+            _scheduler_pid = os.getpid()
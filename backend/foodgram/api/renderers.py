@@ -0,0 +1,103 @@
+import csv
+import io
+import itertools
+import os
+
+from django.conf import settings
+from django.utils.encoding import force_str
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+from rest_framework.renderers import BaseRenderer
+
+
+class ShoppingListRenderer(BaseRenderer):
+    charset = "utf-8"
+    filename = "shopping_list"
+
+    @property
+    def content_type(self):
+        if self.charset:
+            return f"{self.media_type}; charset={self.charset}"
+        return self.media_type
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, dict):
+            data = data.get("detail", data)
+        return force_str(data).encode("utf-8")
+
+    def render_rows(self, rows):
+        raise NotImplementedError(
+            ".render_rows() must be overridden."
+        )
+
+
+class TextShoppingListRenderer(ShoppingListRenderer):
+    media_type = "text/plain"
+    format = "txt"
+
+    def render_rows(self, rows):
+        for item in rows:
+            yield (
+                f'{item["ingredient__name"]} - {item["total"]} '
+                f'{item["ingredient__measurement_unit"]} \n'
+            ).encode(self.charset)
+
+
+class CSVShoppingListRenderer(ShoppingListRenderer):
+    media_type = "text/csv"
+    format = "csv"
+
+    def render_rows(self, rows):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        header = ("Ингредиент", "Количество", "Единица измерения")
+        rows = ((item["ingredient__name"], item["total"],
+                 item["ingredient__measurement_unit"]) for item in rows)
+        for row in itertools.chain((header,), rows):
+            writer.writerow(row)
+            yield buffer.getvalue().encode(self.charset)
+            buffer.seek(0)
+            buffer.truncate()
+
+
+class PDFShoppingListRenderer(ShoppingListRenderer):
+    media_type = "application/pdf"
+    format = "pdf"
+    charset = None
+    font_name = "ShoppingListFont"
+    font_size = 12
+    margin = 50
+    line_height = 18
+
+    def get_font(self):
+        if self.font_name in pdfmetrics.getRegisteredFontNames():
+            return self.font_name
+        if not os.path.exists(settings.SHOPPING_LIST_PDF_FONT):
+            return "Helvetica"
+        pdfmetrics.registerFont(
+            TTFont(self.font_name, settings.SHOPPING_LIST_PDF_FONT)
+        )
+        return self.font_name
+
+    def render_rows(self, rows):
+        buffer = io.BytesIO()
+        document = canvas.Canvas(buffer, pagesize=A4)
+        font = self.get_font()
+        _, height = A4
+        position = height - self.margin
+        document.setFont(font, self.font_size)
+        for item in rows:
+            if position < self.margin:
+                document.showPage()
+                document.setFont(font, self.font_size)
+                position = height - self.margin
+            document.drawString(
+                self.margin, position,
+                f'{item["ingredient__name"]} - {item["total"]} '
+                f'{item["ingredient__measurement_unit"]}'
+            )
+            position -= self.line_height
+        document.save()
+        yield buffer.getvalue()
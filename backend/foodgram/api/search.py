@@ -0,0 +1,239 @@
+import bisect
+import threading
+import time
+from collections import Counter, defaultdict
+from itertools import islice
+
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVector)
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, transaction
+from django.db.models import Case, Count, F, IntegerField, Max, Q, When
+
+from .cache import get_version, is_shared_cache
+from .models import Ingredient, IngredientRecipe, Recipe
+
+SEARCH_CONFIG = "russian"
+SEARCH_INDEX = "recipe_search_vector_idx"
+CHANGE_SEQUENCE_KEY = "recipe_ingredients_sequence"
+CHANGE_KEY = "recipe_ingredients_change:{number}"
+
+
+def normalize(value):
+    return value.casefold().replace("ё", "е")
+
+
+class IngredientIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._entries = None
+        self._keys = None
+
+    def _get_version(self):
+        """
+        Версия из кеша видна всем процессам, только если кеш общий.
+        Иначе версией служат число и максимальный id ингредиентов, а
+        переименования подхватываются раз в INGREDIENT_INDEX_REBUILD_INTERVAL.
+        """
+        if is_shared_cache():
+            return get_version("ingredients")
+        return (
+            *Ingredient.objects.aggregate(
+                count=Count("id"), last_id=Max("id")).values(),
+            int(time.monotonic() // settings.INGREDIENT_INDEX_REBUILD_INTERVAL)
+        )
+
+    def _get_entries(self):
+        version = self._get_version()
+        with self._lock:
+            if self._version != version:
+                self._entries = sorted(
+                    (normalize(name), pk, name, measurement_unit)
+                    for pk, name, measurement_unit
+                    in Ingredient.objects.values_list(
+                        "id", "name", "measurement_unit")
+                )
+                self._keys = [entry[0] for entry in self._entries]
+                self._version = version
+            return self._entries, self._keys
+
+    def search(self, query, limit):
+        entries, keys = self._get_entries()
+        query = normalize(query)
+        start = bisect.bisect_left(keys, query)
+        found = []
+        for entry in islice(entries, start, None):
+            if len(found) >= limit or not entry[0].startswith(query):
+                break
+            found.append(entry)
+        for entry in entries:
+            if len(found) >= limit:
+                break
+            if query in entry[0] and not entry[0].startswith(query):
+                found.append(entry)
+        return [
+            {"id": pk, "name": name, "measurement_unit": measurement_unit}
+            for _, pk, name, measurement_unit in found
+        ]
+
+
+ingredient_index = IngredientIndex()
+
+
+def record_recipe_changes(recipe_ids):
+    recipe_ids = list(recipe_ids)
+
+    def record():
+        cache.add(CHANGE_SEQUENCE_KEY, 0, None)
+        last = cache.incr(CHANGE_SEQUENCE_KEY, len(recipe_ids))
+        cache.set_many({
+            CHANGE_KEY.format(number=last - offset): recipe_id
+            for offset, recipe_id in enumerate(recipe_ids)
+        }, settings.RECIPE_INDEX_CHANGE_TIMEOUT)
+    transaction.on_commit(record)
+
+
+class RecipeIngredientIndex:
+    """
+    Обратный индекс ингредиент -> рецепты для подбора по продуктам.
+
+    Журнал изменений в кеше виден другим процессам, только если кеш общий.
+    Иначе индекс дочитывает новые строки IngredientRecipe по id и
+    перестраивается раз в RECIPE_INDEX_REBUILD_INTERVAL секунд, чтобы
+    учесть удаления, сделанные в других процессах.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sequence = None
+        self._recipes = None
+        self._postings = None
+        self._last_id = 0
+        self._built = 0
+
+    def _rebuild(self, sequence):
+        recipes = defaultdict(list)
+        postings = defaultdict(set)
+        last_id = 0
+        for row_id, recipe_id, ingredient_id in (
+                IngredientRecipe.objects.values_list(
+                    "id", "recipe_id", "ingredient_id"
+                ).order_by().iterator()):
+            recipes[recipe_id].append(ingredient_id)
+            postings[ingredient_id].add(recipe_id)
+            last_id = max(last_id, row_id)
+        self._recipes = {
+            recipe_id: tuple(ingredient_ids)
+            for recipe_id, ingredient_ids in recipes.items()
+        }
+        self._postings = postings
+        self._sequence = sequence
+        self._last_id = last_id
+        self._built = time.monotonic()
+
+    def _apply(self, recipe_ids):
+        for recipe_id in recipe_ids:
+            for ingredient_id in self._recipes.pop(recipe_id, ()):
+                self._postings[ingredient_id].discard(recipe_id)
+        recipes = defaultdict(list)
+        for row_id, recipe_id, ingredient_id in (
+                IngredientRecipe.objects.filter(
+                    recipe_id__in=recipe_ids
+                ).values_list("id", "recipe_id", "ingredient_id").order_by()):
+            recipes[recipe_id].append(ingredient_id)
+            self._postings[ingredient_id].add(recipe_id)
+            self._last_id = max(self._last_id, row_id)
+        for recipe_id, ingredient_ids in recipes.items():
+            self._recipes[recipe_id] = tuple(ingredient_ids)
+
+    def _refresh_local(self):
+        if (time.monotonic() - self._built
+                > settings.RECIPE_INDEX_REBUILD_INTERVAL):
+            self._rebuild(self._sequence)
+            return
+        recipe_ids = set(IngredientRecipe.objects.filter(
+            id__gt=self._last_id).values_list("recipe_id", flat=True))
+        if recipe_ids:
+            self._apply(recipe_ids)
+
+    def _refresh(self):
+        sequence = cache.get(CHANGE_SEQUENCE_KEY, 0)
+        if self._recipes is not None and not is_shared_cache():
+            self._refresh_local()
+        if self._recipes is not None and sequence == self._sequence:
+            return
+        if (self._recipes is None or sequence < self._sequence
+                or sequence - self._sequence
+                > settings.RECIPE_INDEX_MAX_CHANGES):
+            self._rebuild(sequence)
+            return
+        keys = [CHANGE_KEY.format(number=number)
+                for number in range(self._sequence + 1, sequence + 1)]
+        changes = cache.get_many(keys)
+        if len(changes) != len(keys):
+            self._rebuild(sequence)
+            return
+        self._apply(set(changes.values()))
+        self._sequence = sequence
+
+    def rank(self, ingredient_ids, max_missing=None):
+        with self._lock:
+            self._refresh()
+            matched = Counter()
+            for ingredient_id in set(ingredient_ids):
+                matched.update(self._postings.get(ingredient_id, ()))
+            ranked = []
+            for recipe_id, count in matched.items():
+                missing = len(self._recipes[recipe_id]) - count
+                if max_missing is None or missing <= max_missing:
+                    ranked.append((missing, -recipe_id))
+        ranked.sort()
+        return [(-recipe_id, missing) for missing, recipe_id in ranked]
+
+
+recipe_ingredient_index = RecipeIngredientIndex()
+
+
+def is_postgresql(using):
+    return connections[using].vendor == "postgresql"
+
+
+def recipe_search_vector():
+    return (SearchVector("name", weight="A", config=SEARCH_CONFIG)
+            + SearchVector("text", weight="B", config=SEARCH_CONFIG))
+
+
+def update_search_vectors(queryset):
+    if is_postgresql(queryset.db):
+        queryset.update(search_vector=recipe_search_vector())
+
+
+def create_search_index(using):
+    if not is_postgresql(using):
+        return
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            f"CREATE INDEX IF NOT EXISTS {SEARCH_INDEX} "
+            f"ON {Recipe._meta.db_table} USING gin (search_vector)"
+        )
+    update_search_vectors(
+        Recipe.objects.using(using).filter(search_vector__isnull=True))
+
+
+def search_recipes(queryset, terms):
+    if is_postgresql(queryset.db):
+        query = SearchQuery(" ".join(terms), config=SEARCH_CONFIG,
+                            search_type="websearch")
+        return queryset.filter(search_vector=query).annotate(
+            rank=SearchRank(F("search_vector"), query)
+        ).order_by("-rank", "-id")
+    condition = Q()
+    rank = 0
+    for term in terms:
+        condition &= Q(name__icontains=term) | Q(text__icontains=term)
+        rank += Case(When(name__icontains=term, then=2), default=1,
+                     output_field=IntegerField())
+    return queryset.filter(condition).annotate(
+        rank=rank).order_by("-rank", "-id")
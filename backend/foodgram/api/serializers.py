@@ -1,8 +1,9 @@
+from django.conf import settings
 from django.core.validators import MinValueValidator
 from django.http import request
 from drf_extra_fields.fields import Base64ImageField
 
-from django.shortcuts import get_object_or_404
+from django.db import transaction
 
 from djoser.serializers import UserSerializer
 
@@ -10,8 +11,10 @@ from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
 from rest_framework.validators import UniqueTogetherValidator
 
+from .fields import StreamingBase64ImageField
 from .models import (Cart, CustomUser, Favorite, Ingredient, IngredientRecipe, 
-                     Recipe, Subsribe, Tag)
+                     Recipe, Subsribe, Tag, TagRecipe)
+from .user_state import get_user_state
 
 
 class CustomUserSerializer(UserSerializer):
@@ -23,10 +26,9 @@ class CustomUserSerializer(UserSerializer):
                   "last_name", "is_subscribed")
 
     def get_is_subscribed(self, obj):
-        request = self.context.get("request")
-        if request.user.is_authenticated:
-            return Subsribe.objects.filter(
-                user=request.user, author=obj).exists()
+        state = get_user_state(self.context.get("request"))
+        if state is not None:
+            return obj.id in state.following
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -54,7 +56,7 @@ class AddIngredientAmountSerializator(serializers.ModelSerializer):
 
 
 class RecipeSerializer(serializers.ModelSerializer):
-    image = Base64ImageField()
+    image = StreamingBase64ImageField()
     author = CustomUserSerializer(read_only=True)
     ingredients = AddIngredientAmountSerializator(
         source="ingredientrecipe_set", 
@@ -76,74 +78,128 @@ class RecipeSerializer(serializers.ModelSerializer):
                   "is_favorited", "is_in_shopping_cart")
 
     def validate(self, data):
-        ingredients = self.initial_data.pop("ingredients")
-        for ingredient_model in ingredients:
-            if int(ingredient_model["amount"]) < 1:
+        ingredients = self.initial_data.get("ingredients")
+        tags = self.initial_data.get("tags")
+        if not ingredients:
+            raise ValidationError("Добавьте в рецепт хотя бы один ингредиент!")
+        if not tags:
+            raise ValidationError("Добавьте в рецепт хотя бы один тег!")
+        try:
+            amounts = [(int(item["id"]), int(item["amount"]))
+                       for item in ingredients]
+            tag_ids = [int(tag_) for tag_ in tags]
+        except (KeyError, TypeError, ValueError):
+            raise ValidationError(
+                "Ингредиенты и теги должны задаваться целыми числами!")
+        for _, amount in amounts:
+            if amount < 1:
                 raise ValidationError("Количество не может быть меньше 1!")
-        count_unique_ingreds = set([item["id"] for item in ingredients])
-        if len(count_unique_ingreds) != len(ingredients):
+        ingredient_ids = [ingredient_id for ingredient_id, _ in amounts]
+        if len(set(ingredient_ids)) != len(ingredients):
             raise ValidationError(
                 "Несколько раз добавить ингредиент в рецепт нельзя!"
             )
-        data["ingredients"] = ingredients
+        found_ingredients = Ingredient.objects.in_bulk(ingredient_ids)
+        found_tags = Tag.objects.in_bulk(tag_ids)
+        missing_ingredients = set(ingredient_ids) - set(found_ingredients)
+        if missing_ingredients:
+            raise ValidationError(
+                "Ингредиенты не найдены: "
+                f"{', '.join(map(str, sorted(missing_ingredients)))}"
+            )
+        missing_tags = set(tag_ids) - set(found_tags)
+        if missing_tags:
+            raise ValidationError(
+                f"Теги не найдены: {', '.join(map(str, sorted(missing_tags)))}"
+            )
+        data["ingredients"] = {
+            found_ingredients[ingredient_id]: amount
+            for ingredient_id, amount in amounts
+        }
+        data["tags"] = list(found_tags.values())
         return data
-    
+
+    @transaction.atomic
     def create(self, validated_data):
-        image = validated_data.pop("image")
         ingredients = validated_data.pop("ingredients")
-        tags_data = self.initial_data.pop("tags")
-        recipe = Recipe.objects.create(
-            author=get_object_or_404(
-                CustomUser, id=validated_data.pop("author").id),
-                image=image, **validated_data
+        tags = validated_data.pop("tags")
+        recipe = Recipe.objects.create(**validated_data)
+        TagRecipe.objects.bulk_create(
+            TagRecipe(recipe=recipe, tags=tag_) for tag_ in tags
+        )
+        IngredientRecipe.objects.bulk_create(
+            IngredientRecipe(ingredient=ingredient, recipe=recipe,
+                             amount=amount)
+            for ingredient, amount in ingredients.items()
         )
-        for tag_ in tags_data:
-            recipe.tags.add(get_object_or_404(Tag, id=tag_))
-        for ingredient_model in ingredients:
-            amount = ingredient_model.pop("amount")
-            current_ingredient = get_object_or_404(Ingredient, 
-                id=ingredient_model.pop("id")
-            )
-            IngredientRecipe.objects.create(
-                ingredient=current_ingredient, recipe=recipe, amount=amount
-            )
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        instance.name = validated_data.get("name", instance.name)
-        instance.text = validated_data.get("text", instance.text)
-        instance.cooking_time = (
-            validated_data.get("cooking_time", instance.cooking_time)
-        )
-        instance.image = validated_data.get("image", instance.image)
-        instance.tags.clear()
-        IngredientRecipe.objects.filter(recipe=instance).delete()
-        tags_data = self.initial_data.pop("tags")
-        for tag_ in tags_data:
-            instance.tags.add(get_object_or_404(Tag, id=tag_))
-        ingredients = validated_data.pop("ingredients")
-        for ingredient_model in ingredients:
-            amount = ingredient_model.pop("amount")
-            current_ingredient = get_object_or_404(Ingredient,
-                id=ingredient_model.pop("id")
-            )
-            IngredientRecipe.objects.create(
-                ingredient=current_ingredient, recipe=instance, amount=amount
-            )
-        instance.save()
+        self.update_tags(instance, validated_data.pop("tags"))
+        self.update_ingredients(instance, validated_data.pop("ingredients"))
+        for field, value in validated_data.items():
+            setattr(instance, field, value)
+        instance.save(update_fields={
+            "name", "text", "cooking_time", *validated_data})
         return instance
+
+    def update_tags(self, recipe, tags):
+        current = set(TagRecipe.objects.filter(
+            recipe=recipe).values_list("tags_id", flat=True))
+        new = {tag_.id: tag_ for tag_ in tags}
+        removed = current - set(new)
+        if removed:
+            TagRecipe.objects.filter(
+                recipe=recipe, tags_id__in=removed).delete()
+        TagRecipe.objects.bulk_create(
+            TagRecipe(recipe=recipe, tags=tag_)
+            for tag_id, tag_ in new.items() if tag_id not in current
+        )
+
+    def update_ingredients(self, recipe, ingredients):
+        current = {
+            composition.ingredient_id: composition
+            for composition in IngredientRecipe.objects.filter(recipe=recipe)
+        }
+        amounts = {
+            ingredient.id: amount for ingredient, amount in ingredients.items()
+        }
+        removed = set(current) - set(amounts)
+        if removed:
+            IngredientRecipe.objects.filter(
+                recipe=recipe, ingredient_id__in=removed).delete()
+        changed = []
+        for ingredient_id, composition in current.items():
+            amount = amounts.get(ingredient_id)
+            if amount is not None and composition.amount != amount:
+                composition.amount = amount
+                changed.append(composition)
+        if changed:
+            IngredientRecipe.objects.bulk_update(changed, ("amount",))
+        IngredientRecipe.objects.bulk_create(
+            IngredientRecipe(ingredient=ingredient, recipe=recipe,
+                             amount=amount)
+            for ingredient, amount in ingredients.items()
+            if ingredient.id not in current
+        )
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        if self.context.get("thumbnails") and instance.image_thumbnail:
+            data["image"] = self.fields["image"].to_representation(
+                instance.image_thumbnail)
+        return data
     
     def get_is_favorited(self, obj):
-        request = self.context.get("request")
-        if request.user.is_authenticated:
-            return Favorite.objects.filter(
-                recipe=obj, user=request.user).exists()
+        state = get_user_state(self.context.get("request"))
+        if state is not None:
+            return obj.id in state.favorites
     
     def get_is_in_shopping_cart(self, obj):
-        request = self.context.get("request")
-        if request.user.is_authenticated:
-            return Cart.objects.filter(
-                recipe=obj, user=request.user).exists()
+        state = get_user_state(self.context.get("request"))
+        if state is not None:
+            return obj.id in state.cart
 
 
 class RecipeMinifiedSerializer(serializers.ModelSerializer):
@@ -154,6 +210,13 @@ class RecipeMinifiedSerializer(serializers.ModelSerializer):
         fields = ("id", "name", "cooking_time", "image")
         read_only_fields = ("id", "name", "cooking_time", "image")
 
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        if instance.image_thumbnail:
+            data["image"] = self.fields["image"].to_representation(
+                instance.image_thumbnail)
+        return data
+
 
 class CreateFavoriteSerializer(serializers.ModelSerializer):
     queryset = Recipe.objects.all()
@@ -192,20 +255,21 @@ class SubsribeSerializer(serializers.ModelSerializer):
                   "is_subscribed","recipes", "recipes_count",)
         
     def get_recipes(self, obj):
-        request = self.context.get("request")
-        limit = request.GET.get("recipes_limit")
-        queryset = obj.author.recipe_set.all().order_by("-id")
-        if limit:
-            obj.author.recipe_set.all().order_by("-id")[:int(limit)]
+        queryset = getattr(obj.author, "latest_recipes", None)
+        if queryset is None:
+            queryset = obj.author.recipe_set.all().order_by("-id")
+            limit = self.context.get("recipes_limit")
+            if limit:
+                queryset = queryset[:limit]
         return RecipeMinifiedSerializer(queryset, many=True).data
 
     def get_recipes_count(self, obj):
-        return obj.author.recipe_set.count()
+        return obj.author.recipes_count
 
     def get_is_subscribed(self, obj):
         request = self.context.get("request")
         if request.user.is_authenticated:
-            return obj.author.subscribing.exists()
+            return obj.user_id == request.user.id
 
 
 class ShowSubsribeSerializer(serializers.ModelSerializer):
@@ -219,17 +283,21 @@ class ShowSubsribeSerializer(serializers.ModelSerializer):
                   "is_subscribed","recipes", "recipes_count",)
         
     def get_recipes(self, obj):
-        limit = self.context.get("recipes_limit")
-        queryset = obj.recipe_set.all().order_by("-id")
-        if limit:
-            obj.recipe_set.all().order_by("-id")[:int(limit)]
+        queryset = getattr(obj, "latest_recipes", None)
+        if queryset is None:
+            queryset = obj.recipe_set.all().order_by("-id")
+            limit = self.context.get("recipes_limit")
+            if limit:
+                queryset = queryset[:limit]
         return RecipeMinifiedSerializer(queryset, many=True).data
 
     def get_recipes_count(self, obj):
-        return obj.recipe_set.count()
+        return obj.recipes_count
 
     def get_is_subscribed(self, obj):
-        return obj.subscribing.exists()
+        state = get_user_state(self.context.get("request"))
+        if state is not None:
+            return obj.id in state.following
 
 
 class CreateSubsribeSerializer(serializers.ModelSerializer):
@@ -256,10 +324,8 @@ class CreateSubsribeSerializer(serializers.ModelSerializer):
         return data
 
     def to_representation(self, instance):
-        request = self.context.get("request")
         return ShowSubsribeSerializer(
-            instance.author,
-            context={"request": request}).data
+            instance.author, context=self.context).data
 
 
 class CreateCartSerializer(serializers.ModelSerializer):
@@ -281,3 +347,11 @@ class CreateCartSerializer(serializers.ModelSerializer):
         return RecipeMinifiedSerializer(
             instance.recipe,
             context={"request": request}).data
+
+
+class BatchIdsSerializer(serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.BATCH_MAX_SIZE
+    )
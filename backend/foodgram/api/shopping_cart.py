@@ -0,0 +1,66 @@
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Sum
+
+from .cache import is_shared_cache
+from .models import Cart, IngredientRecipe
+
+CART_VERSION_KEY = "shopping_cart_version:{user_id}"
+SHOPPING_LIST_KEY = "shopping_list:{user_id}:{version}:{format}"
+
+
+def get_shopping_list(user):
+    return IngredientRecipe.objects.filter(
+        recipe__in_cart__user=user
+    ).values(
+        "ingredient__id", "ingredient__name", "ingredient__measurement_unit"
+    ).annotate(total=Sum("amount")).order_by("ingredient__name")
+
+
+def get_cart_version(user_id):
+    return cache.get_or_set(
+        CART_VERSION_KEY.format(user_id=user_id), uuid4().hex, None
+    )
+
+
+def bump_cart_versions(user_ids):
+    keys = [CART_VERSION_KEY.format(user_id=user_id) for user_id in user_ids]
+    transaction.on_commit(lambda: cache.set_many(
+        {key: uuid4().hex for key in keys}, None))
+
+
+def bump_recipe_cart_versions(recipe_id):
+    if not is_shared_cache():
+        return
+    bump_cart_versions(set(Cart.objects.filter(
+        recipe_id=recipe_id).values_list("user_id", flat=True)))
+
+
+def export_shopping_list(user, renderer):
+    """
+    Готовый документ кешируется, только если кеш общий: версию корзины,
+    сброшенную в одном процессе, должны увидеть все остальные.
+    """
+    if not is_shared_cache():
+        return renderer.render_rows(get_shopping_list(user).iterator())
+    key = SHOPPING_LIST_KEY.format(
+        user_id=user.id, version=get_cart_version(user.id),
+        format=renderer.format
+    )
+    document = cache.get(key)
+    if document is not None:
+        return iter((document,))
+    return _cache_chunks(
+        key, renderer.render_rows(get_shopping_list(user).iterator())
+    )
+
+
+def _cache_chunks(key, chunks):
+    document = []
+    for chunk in chunks:
+        document.append(chunk)
+        yield chunk
+    cache.set(key, b"".join(document), settings.SHOPPING_LIST_CACHE_TIMEOUT)
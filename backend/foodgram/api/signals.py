@@ -0,0 +1,156 @@
+from django.core.signals import request_started
+from django.db import transaction
+from django.db.models.signals import (post_delete, post_init, post_migrate,
+                                      post_save)
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import invalidate_tokens
+from .cache import bump_version
+from .connections import check_connections
+from .counters import change_count
+from .images import schedule_processing
+from .models import (Cart, CustomUser, Favorite, Ingredient, IngredientRecipe,
+                     Recipe, Subsribe, Tag)
+from .search import (create_search_index, record_recipe_changes,
+                     update_search_vectors)
+from .shopping_cart import bump_cart_versions, bump_recipe_cart_versions
+from .user_state import invalidate_user_states
+
+
+request_started.connect(check_connections)
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    invalidate_tokens((instance.key,))
+
+
+@receiver(post_save, sender=CustomUser)
+def user_changed(sender, instance, created, update_fields, **kwargs):
+    if created or update_fields == {"last_login"}:
+        return
+    invalidate_tokens(Token.objects.filter(
+        user_id=instance.pk).values_list("key", flat=True))
+
+
+@receiver(post_save, sender=Cart)
+@receiver(post_delete, sender=Cart)
+def cart_changed(sender, instance, **kwargs):
+    bump_cart_versions((instance.user_id,))
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_delete, sender=Favorite)
+@receiver(post_save, sender=Cart)
+@receiver(post_delete, sender=Cart)
+@receiver(post_save, sender=Subsribe)
+@receiver(post_delete, sender=Subsribe)
+def user_state_changed(sender, instance, **kwargs):
+    invalidate_user_states((instance.user_id,))
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_changed(sender, instance, created, **kwargs):
+    if not created:
+        bump_recipe_cart_versions(instance.id)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_save, sender=IngredientRecipe)
+@receiver(post_delete, sender=IngredientRecipe)
+def recipe_ingredients_changed(sender, instance, **kwargs):
+    record_recipe_changes((
+        instance.pk if sender is Recipe else instance.recipe_id,))
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def ingredient_changed(sender, instance, **kwargs):
+    bump_version("ingredients")
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def tag_changed(sender, instance, **kwargs):
+    bump_version("tags")
+
+
+@receiver(post_save, sender=Favorite)
+def favorite_created(sender, instance, created, **kwargs):
+    if created:
+        change_count(Recipe.objects.filter(pk=instance.recipe_id),
+                     "favorites_count", 1)
+
+
+@receiver(post_delete, sender=Favorite)
+def favorite_deleted(sender, instance, **kwargs):
+    change_count(Recipe.objects.filter(pk=instance.recipe_id),
+                 "favorites_count", -1)
+
+
+@receiver(post_save, sender=Cart)
+def cart_created(sender, instance, created, **kwargs):
+    if created:
+        change_count(Recipe.objects.filter(pk=instance.recipe_id),
+                     "in_cart_count", 1)
+
+
+@receiver(post_delete, sender=Cart)
+def cart_deleted(sender, instance, **kwargs):
+    change_count(Recipe.objects.filter(pk=instance.recipe_id),
+                 "in_cart_count", -1)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_created(sender, instance, created, **kwargs):
+    if created:
+        change_count(CustomUser.objects.filter(pk=instance.author_id),
+                     "recipes_count", 1)
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    change_count(CustomUser.objects.filter(pk=instance.author_id),
+                 "recipes_count", -1)
+
+
+@receiver(post_init, sender=Recipe)
+def remember_image(sender, instance, **kwargs):
+    image = instance.__dict__.get("image")
+    instance._original_image = getattr(image, "name", image)
+
+
+@receiver(post_init, sender=Recipe)
+def remember_search_text(sender, instance, **kwargs):
+    instance._original_search_text = (
+        instance.__dict__.get("name"), instance.__dict__.get("text"))
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_search_text_changed(sender, instance, created, **kwargs):
+    search_text = (instance.name, instance.text)
+    if created or search_text != instance._original_search_text:
+        update_search_vectors(Recipe.objects.filter(pk=instance.pk))
+        instance._original_search_text = search_text
+
+
+@receiver(post_migrate)
+def search_index_migrated(sender, using, **kwargs):
+    if sender.name == "api":
+        create_search_index(using)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_image_changed(sender, instance, created, **kwargs):
+    image = instance.image.name
+    if not image or (image == instance._original_image
+                     and instance.image_thumbnail):
+        return
+    if not created and instance.image_thumbnail:
+        Recipe.objects.filter(pk=instance.pk).update(
+            image_thumbnail=None, image_webp=None)
+    instance._original_image = image
+    transaction.on_commit(
+        lambda: schedule_processing(instance.pk, image))
@@ -0,0 +1,413 @@
+import base64
+import io
+import json
+import random
+import shutil
+import tempfile
+from unittest import mock, skipUnless
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from .authentication import get_token_version
+from .batch import get_existing
+from .fields import StreamingBase64ImageField
+from .images import process_image
+from .management.commands.benchmark import seed_dataset
+from .models import (Cart, CustomUser, Favorite, Ingredient, IngredientRecipe,
+                     Recipe, RecipeRanking, Subsribe)
+from .rankings import refresh_rankings
+
+
+def seed_recipes(recipes=200):
+    Ingredient.objects.bulk_create(
+        Ingredient(name=f"Ингредиент {number}", measurement_unit="г")
+        for number in range(20)
+    )
+    return seed_dataset(
+        random.Random(0), users=5, recipes=recipes, ingredients_per_recipe=5,
+        favorites=recipes // 3, cart=recipes // 4, subscriptions=1)
+
+
+def get_plan_nodes(plan):
+    yield plan
+    for child in plan.get("Plans", ()):
+        yield from get_plan_nodes(child)
+
+
+def get_seq_scans(sql):
+    with connection.cursor() as cursor:
+        cursor.execute("SET LOCAL enable_seqscan = off")
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}")
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return [node["Relation Name"] for node in get_plan_nodes(plan[0]["Plan"])
+            if node["Node Type"] == "Seq Scan"]
+
+
+class RecipeListQueriesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = seed_recipes(recipes=60).users[0]
+
+    def count_queries(self, client, limit):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(f"/api/recipes/?limit={limit}")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data["results"]), limit)
+        return len(queries)
+
+    def test_query_count_does_not_depend_on_page_size(self):
+        anonymous = APIClient()
+        authenticated = APIClient()
+        authenticated.force_authenticate(self.user)
+        for fast in (False, True):
+            for name, client in (("anonymous", anonymous),
+                                 ("authenticated", authenticated)):
+                with self.subTest(fast=fast, client=name), override_settings(
+                        FAST_RECIPE_RENDERING=fast):
+                    queries = self.count_queries(client, 5)
+                    cache.clear()
+                    with self.assertNumQueries(queries):
+                        client.get("/api/recipes/?limit=50")
+
+
+class FastRenderingTests(TestCase):
+    """Быстрые представления отдают те же байты, что и сериализаторы DRF."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.media_root = tempfile.mkdtemp()
+        cls.media_settings = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.media_settings.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.media_settings.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+
+    @classmethod
+    def setUpTestData(cls):
+        dataset = seed_recipes(recipes=30)
+        cls.user = dataset.users[1]
+        cls.plain_recipe_id = min(dataset.recipe_ids)
+        cls.image_recipe_id = max(dataset.recipe_ids)
+        buffer = io.BytesIO()
+        Image.new("RGB", (640, 480), "orange").save(buffer, "PNG")
+        image = default_storage.save(
+            "media/recipes/test.png", ContentFile(buffer.getvalue()))
+        Recipe.objects.filter(pk=cls.image_recipe_id).update(image=image)
+        process_image(cls.image_recipe_id, image)
+
+    def get_content(self, client, url, fast):
+        cache.clear()
+        with override_settings(FAST_RECIPE_RENDERING=fast):
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.content
+
+    def test_fast_rendering_matches_serializers(self):
+        urls = {
+            "list": "/api/recipes/?limit=10",
+            "detail": f"/api/recipes/{self.plain_recipe_id}/",
+            "detail_image": f"/api/recipes/{self.image_recipe_id}/",
+            "subscriptions": "/api/users/subscriptions/?recipes_limit=3",
+        }
+        anonymous = APIClient()
+        authenticated = APIClient()
+        authenticated.force_authenticate(self.user)
+        for name, url in urls.items():
+            for client_name, client in (("anonymous", anonymous),
+                                        ("authenticated", authenticated)):
+                if name == "subscriptions" and client_name == "anonymous":
+                    continue
+                with self.subTest(name, client=client_name):
+                    self.assertEqual(self.get_content(client, url, False),
+                                     self.get_content(client, url, True))
+
+    def test_lists_use_thumbnails(self):
+        RecipeRanking.objects.create(
+            recipe_id=self.image_recipe_id, popularity=1, trending=1)
+        ingredients = ",".join(map(str, IngredientRecipe.objects.filter(
+            recipe_id=self.image_recipe_id
+        ).values_list("ingredient_id", flat=True)))
+        client = APIClient()
+        client.force_authenticate(self.user)
+        urls = {
+            "list": "/api/recipes/?limit=10",
+            "feed": "/api/recipes/feed/?limit=10",
+            "trending": "/api/recipes/trending/",
+            "can_cook": f"/api/recipes/can_cook/?ingredients={ingredients}",
+        }
+        for name, url in urls.items():
+            with self.subTest(name):
+                results = json.loads(
+                    self.get_content(client, url, True))["results"]
+                image = next(item["image"] for item in results
+                             if item["id"] == self.image_recipe_id)
+                self.assertIn("/thumbnails/", image)
+        detail = json.loads(self.get_content(
+            client, f"/api/recipes/{self.image_recipe_id}/", False))
+        self.assertNotIn("/thumbnails/", detail["image"])
+
+
+class TokenInvalidationTests(TestCase):
+    """Токены кешируются только с общим кешем, поэтому он и подменяется."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.cache_dir = tempfile.mkdtemp()
+        cls.cache_settings = override_settings(CACHES={"default": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": cls.cache_dir,
+        }}, AUTH_TOKEN_SHARED_CACHE=True)
+        cls.cache_settings.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.cache_settings.disable()
+        shutil.rmtree(cls.cache_dir, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(
+            email="cook@foodgram.ru", username="cook", first_name="Имя",
+            last_name="Фамилия", password="old-password")
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+        self.assertEqual(self.get_me().status_code, 200)
+
+    def get_me(self):
+        return self.client.get("/api/users/me/")
+
+    def loads_token(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.get_me().status_code, 200)
+        return any(Token._meta.db_table in query["sql"]
+                   for query in queries.captured_queries)
+
+    def save_user(self, **kwargs):
+        version = get_token_version(self.token.key)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save(**kwargs)
+        return get_token_version(self.token.key) != version
+
+    def test_cached_token_skips_database(self):
+        self.assertFalse(self.loads_token())
+
+    def test_revoked_token_is_rejected(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post("/api/auth/token/logout/")
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.get_me().status_code, 401)
+
+    def test_password_change_invalidates_tokens(self):
+        self.user.set_password("new-password")
+        self.assertTrue(self.save_user())
+        self.assertTrue(self.loads_token())
+
+    def test_deactivation_invalidates_tokens(self):
+        self.user.is_active = False
+        self.assertTrue(self.save_user())
+        self.assertEqual(self.get_me().status_code, 401)
+
+    def test_last_login_does_not_invalidate_tokens(self):
+        self.user.last_login = timezone.now()
+        self.assertFalse(self.save_user(update_fields=("last_login",)))
+        self.assertFalse(self.loads_token())
+
+
+class BatchRelationsTests(TestCase):
+    relations = (
+        ("favorite", Favorite, "favorites_count"),
+        ("shopping_cart", Cart, "in_cart_count"),
+    )
+
+    @classmethod
+    def setUpTestData(cls):
+        dataset = seed_recipes(recipes=10)
+        cls.author = dataset.users[0]
+        cls.user = CustomUser.objects.create_user(
+            email="batch@foodgram.ru", username="batch", first_name="Имя",
+            last_name="Фамилия", password="password")
+        cls.first_id, cls.second_id, cls.third_id = sorted(
+            dataset.recipe_ids)[:3]
+        cls.unknown_id = max(dataset.recipe_ids) + 1000
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def send(self, method, url, ids):
+        response = getattr(self.client, method)(
+            url, {"ids": ids}, format="json")
+        self.assertEqual(response.status_code, 200)
+        return {item["id"]: item["status"]
+                for item in response.data["results"]}
+
+    def get_counts(self, counter):
+        return dict(Recipe.objects.filter(pk__in=(
+            self.first_id, self.second_id, self.third_id
+        )).values_list("pk", counter))
+
+    def test_recipe_relations(self):
+        for name, model, counter in self.relations:
+            with self.subTest(name):
+                url = f"/api/recipes/{name}_batch/"
+                model.objects.create(user=self.user, recipe_id=self.first_id)
+                before = self.get_counts(counter)
+                self.assertEqual(self.send("post", url, [
+                    self.first_id, self.second_id, self.unknown_id,
+                    self.second_id,
+                ]), {self.first_id: "exists", self.second_id: "created",
+                     self.unknown_id: "not_found"})
+                after = self.get_counts(counter)
+                self.assertEqual(after[self.first_id], before[self.first_id])
+                self.assertEqual(after[self.second_id],
+                                 before[self.second_id] + 1)
+                self.assertEqual(self.send("delete", url, [
+                    self.first_id, self.second_id, self.third_id,
+                    self.unknown_id,
+                ]), {self.first_id: "deleted", self.second_id: "deleted",
+                     self.third_id: "missing", self.unknown_id: "not_found"})
+                self.assertEqual(self.get_counts(counter), {
+                    self.first_id: before[self.first_id] - 1,
+                    self.second_id: before[self.second_id],
+                    self.third_id: before[self.third_id],
+                })
+                self.assertFalse(model.objects.filter(user=self.user).exists())
+
+    def test_subscriptions(self):
+        url = "/api/users/subscribe_batch/"
+        ids = [self.author.id, self.user.id, self.unknown_id]
+        self.assertEqual(self.send("post", url, ids), {
+            self.author.id: "created", self.user.id: "self",
+            self.unknown_id: "not_found"})
+        self.assertEqual(self.send("post", url, ids)[self.author.id],
+                         "exists")
+        self.assertEqual(self.send("delete", url, ids), {
+            self.author.id: "deleted", self.user.id: "missing",
+            self.unknown_id: "not_found"})
+        self.assertFalse(Subsribe.objects.filter(user=self.user).exists())
+
+    def test_concurrent_insert_falls_back_to_single_rows(self):
+        """Связь, добавленную параллельным запросом, не считаем дважды."""
+        Favorite.objects.create(user=self.user, recipe_id=self.first_id)
+        before = self.get_counts("favorites_count")
+
+        def get_existing_before_insert(model, user, ids):
+            found, _ = get_existing(model, user, ids)
+            return found, {}
+
+        with mock.patch("api.batch.get_existing",
+                        get_existing_before_insert):
+            statuses = self.send("post", "/api/recipes/favorite_batch/",
+                                 [self.first_id, self.second_id])
+        self.assertEqual(statuses, {self.first_id: "exists",
+                                    self.second_id: "created"})
+        after = self.get_counts("favorites_count")
+        self.assertEqual(after[self.first_id], before[self.first_id])
+        self.assertEqual(after[self.second_id], before[self.second_id] + 1)
+
+
+class StreamingBase64ImageFieldTests(TestCase):
+    def test_decodes_line_wrapped_base64(self):
+        buffer = io.BytesIO()
+        Image.effect_noise((64, 64), 50).save(buffer, "PNG")
+        image = buffer.getvalue()
+        field = StreamingBase64ImageField()
+        field.chunk_size = 1000
+        for name, encoded in (("plain", base64.b64encode(image)),
+                              ("mime", base64.encodebytes(image)),
+                              ("crlf", base64.encodebytes(image).replace(
+                                  b"\n", b"\r\n"))):
+            with self.subTest(name):
+                file = field.to_internal_value(
+                    "data:image/png;base64," + encoded.decode("ascii"))
+                self.assertEqual(file.read(), image)
+                self.assertEqual(file.size, len(image))
+
+
+class RankingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        dataset = seed_recipes(recipes=10)
+        cls.user = dataset.users[1]
+        cls.recipe = Recipe.objects.filter(
+            favorites_count=0, in_cart_count=0).first()
+
+    def get_ranking(self):
+        refresh_rankings()
+        return RecipeRanking.objects.get(recipe=self.recipe)
+
+    def test_popularity_follows_counters(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        url = f"/api/recipes/{self.recipe.id}/favorite/"
+        client.get(url)
+        popularity = self.get_ranking().popularity
+        self.assertGreater(popularity, 0)
+        for _ in range(3):
+            client.delete(url)
+            self.assertEqual(self.get_ranking().popularity, 0)
+            client.get(url)
+            self.assertEqual(self.get_ranking().popularity, popularity)
+
+
+@skipUnless(connection.vendor == "postgresql",
+            "Планы запросов проверяются только на PostgreSQL")
+class RecipeFilterPlanTests(TestCase):
+    """
+    Последовательное сканирование запрещено: если оно всё равно
+    попало в план, для запроса нет подходящего индекса.
+    """
+
+    urls = {
+        "list": "/api/recipes/?limit=6",
+        "tags": "/api/recipes/?limit=6&tags=breakfast&tags=lunch",
+        "author": "/api/recipes/?limit=6&author={author}",
+        "is_favorited": "/api/recipes/?limit=6&is_favorited=1",
+        "is_in_shopping_cart": "/api/recipes/?limit=6&is_in_shopping_cart=1",
+        "all_filters": "/api/recipes/?limit=6&tags=dinner&author={author}"
+                       "&is_favorited=1&is_in_shopping_cart=1",
+        "popular": "/api/recipes/?limit=6&ordering=popular",
+        "search": "/api/recipes/?limit=6&search=Борщ",
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = seed_recipes().users[0]
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_filters_use_indexes(self):
+        for name, url in self.urls.items():
+            with self.subTest(name), CaptureQueriesContext(
+                    connection) as queries:
+                response = self.client.get(url.format(author=self.user.id))
+                self.assertEqual(response.status_code, 200)
+                for query in queries.captured_queries:
+                    sql = query["sql"]
+                    if not sql.lstrip().upper().startswith("SELECT"):
+                        continue
+                    self.assertEqual(get_seq_scans(sql), [], sql)
@@ -1,4 +1,5 @@
-from django.urls import include, path
+from django.conf import settings
+from django.urls import URLPattern, include, path
 
 from rest_framework import routers
 
@@ -13,6 +14,22 @@ router.register("ingredients", IngredientViewSet, basename="ingredients")
 router.register("recipes", RecipeViewSet, basename="recipes")
 router.register("tags", TagViewSet, basename="tags")
 
+ASYNC_READ_ROUTES = (
+    "recipes-list", "recipes-detail", "recipes-download-shopping-cart",
+    "tags-list", "tags-detail", "ingredients-list", "ingredients-detail",
+)
+
+router_urls = router.urls
+if settings.ASYNC_READ_VIEWS:
+    from .async_views import offload_safe_methods
+
+    router_urls = [
+        URLPattern(url.pattern, offload_safe_methods(url.callback),
+                   url.default_args, url.name)
+        if url.name in ASYNC_READ_ROUTES else url
+        for url in router_urls
+    ]
+
 urlpatterns = [
-    path("", include(router.urls)),
+    path("", include(router_urls)),
 ]
@@ -0,0 +1,61 @@
+from array import array
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import models, transaction
+
+from .models import Cart, Favorite, Subsribe
+
+STATE_KEY = "user_state:{user_id}"
+SOURCES = (
+    ("favorites", Favorite, "recipe_id"),
+    ("cart", Cart, "recipe_id"),
+    ("following", Subsribe, "author_id"),
+)
+
+
+class UserState:
+    def __init__(self, favorites=(), cart=(), following=()):
+        self.favorites = frozenset(favorites)
+        self.cart = frozenset(cart)
+        self.following = frozenset(following)
+
+
+def load_user_state(user_id):
+    queries = [
+        model.objects.filter(user_id=user_id).annotate(
+            kind=models.Value(kind, output_field=models.CharField())
+        ).order_by().values_list(field, "kind")
+        for kind, model, field in SOURCES
+    ]
+    ids = {kind: array("q") for kind, _, _ in SOURCES}
+    for object_id, kind in queries[0].union(*queries[1:], all=True):
+        ids[kind].append(object_id)
+    return ids
+
+
+def get_cached_user_state(user_id):
+    if not settings.USER_STATE_CACHE_TIMEOUT:
+        return UserState(**load_user_state(user_id))
+    key = STATE_KEY.format(user_id=user_id)
+    ids = cache.get(key)
+    if ids is None:
+        ids = load_user_state(user_id)
+        cache.set(key, ids, settings.USER_STATE_CACHE_TIMEOUT)
+    return UserState(**ids)
+
+
+def get_user_state(request):
+    """Избранное, корзина и подписки текущего пользователя за один запрос."""
+    if request is None or not request.user.is_authenticated:
+        return None
+    state = getattr(request, "_user_state", None)
+    if state is None:
+        state = get_cached_user_state(request.user.id)
+        request._user_state = state
+    return state
+
+
+def invalidate_user_states(user_ids):
+    keys = [STATE_KEY.format(user_id=user_id) for user_id in user_ids]
+    transaction.on_commit(lambda: cache.delete_many(keys))
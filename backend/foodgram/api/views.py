@@ -1,24 +1,69 @@
-from django.http.response import HttpResponse
+from django.conf import settings
+from django.http import Http404
+from django.http.response import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 
+from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
 
 from rest_framework import mixins, status, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
-from .filters import IngredientSearchFilter, TagAndAuthorFilter
-from .models import (Cart, Favorite, Ingredient, IngredientRecipe, 
+from .batch import add_relations, remove_relations
+from .cache import CachedResponseMixin
+from .filters import (IngredientSearchFilter, RecipeSearchFilter,
+                      TagAndAuthorFilter)
+from .models import (Cart, Favorite, Ingredient, 
                      Recipe, Subsribe, Tag, CustomUser)
+from .pagination import (LimitCursorPagination, LimitPagination,
+                         PaginationModeMixin)
 from .permissions import OwnerOrReadOnly
-from .serializers import (CreateCartSerializer, CreateFavoriteSerializer, 
-                          CreateSubsribeSerializer, CustomUserSerializer, 
-                          IngredientSerializer, RecipeSerializer, 
-                          SubsribeSerializer, TagSerializer)
+from .renderers import (CSVShoppingListRenderer, PDFShoppingListRenderer,
+                        TextShoppingListRenderer)
+from .representations import (SUBSCRIPTION_FIELDS, render_recipes,
+                              render_subscriptions)
+from .serializers import (BatchIdsSerializer, CreateCartSerializer,
+                          CreateFavoriteSerializer, CreateSubsribeSerializer,
+                          CustomUserSerializer, IngredientSerializer,
+                          RecipeSerializer, SubsribeSerializer, TagSerializer)
+from .search import ingredient_index, recipe_ingredient_index
+from .shopping_cart import export_shopping_list
+from .user_state import get_user_state
 
 
-class CustomViewSet(UserViewSet):
+def get_recipes_limit(request):
+    limit = request.query_params.get("recipes_limit", "")
+    return int(limit) if limit.isdigit() else None
+
+
+def batch_response(request, model, delete=False):
+    serializer = BatchIdsSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    change = remove_relations if delete else add_relations
+    return Response(
+        {"results": change(model, request.user,
+                           serializer.validated_data["ids"])},
+        status=status.HTTP_200_OK
+    )
+
+
+def get_ingredient_ids(request):
+    return {
+        int(value)
+        for param in request.query_params.getlist("ingredients")
+        for value in param.split(",") if value.strip().isdigit()
+    }
+
+
+def get_max_missing(request):
+    max_missing = request.query_params.get("max_missing", "")
+    return int(max_missing) if max_missing.isdigit() else None
+
+
+class CustomViewSet(PaginationModeMixin, UserViewSet):
     serializer_class = CustomUserSerializer
 
     @action(detail=True, permission_classes=(IsAuthenticated,))
@@ -27,7 +72,10 @@ class CustomViewSet(UserViewSet):
             "user": request.user.id,
             "author": id,
         }
-        serializer = CreateSubsribeSerializer(data=data) 
+        serializer = CreateSubsribeSerializer(data=data, context={
+            "request": request,
+            "recipes_limit": get_recipes_limit(request),
+        })
         serializer.is_valid(raise_exception=True)
         serializer.save()
         return Response(serializer.data, status=status.HTTP_201_CREATED)
@@ -39,23 +87,75 @@ class CustomViewSet(UserViewSet):
             user=user, author=get_object_or_404(CustomUser, id=id)).delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
     
+    @action(detail=False, methods=["post"],
+            permission_classes=(IsAuthenticated,))
+    def subscribe_batch(self, request):
+        return batch_response(request, Subsribe)
+
+    @subscribe_batch.mapping.delete
+    def delete_subscribe_batch(self, request):
+        return batch_response(request, Subsribe, delete=True)
+
     @action(detail=False, permission_classes=(IsAuthenticated,),)
     def subscriptions(self, request, id=None):
         user = request.user
-        subsribers = user.subsriber.all()
+        if settings.FAST_RECIPE_RENDERING:
+            page = self.paginate_queryset(
+                user.subsriber.values(*SUBSCRIPTION_FIELDS))
+            recipes = Recipe.objects.latest_for_authors(
+                {row["author_id"] for row in page},
+                get_recipes_limit(request))
+            return self.get_paginated_response(
+                render_subscriptions(page, recipes, request))
+        subsribers = user.subsriber.select_related("author")
         page = self.paginate_queryset(subsribers)
+        authors = {item.author_id: item.author for item in page}
+        for author in authors.values():
+            author.latest_recipes = []
+        for recipe in Recipe.objects.latest_for_authors(
+                authors, get_recipes_limit(request)):
+            authors[recipe.author_id].latest_recipes.append(recipe)
         serializer = SubsribeSerializer(
             page, many=True, context={"request": request}
         )
         return self.get_paginated_response(serializer.data)
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(PaginationModeMixin, viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
     serializer_class = RecipeSerializer
     permission_classes = (OwnerOrReadOnly,)
+    filter_backends = (DjangoFilterBackend, RecipeSearchFilter)
     filter_class = TagAndAuthorFilter
 
+    def get_queryset(self):
+        return Recipe.objects.with_related()
+
+    def get_serializer(self, *args, **kwargs):
+        if not kwargs.get("many"):
+            return super().get_serializer(*args, **kwargs)
+        context = self.get_serializer_context()
+        context["thumbnails"] = True
+        return self.get_serializer_class()(*args, context=context, **kwargs)
+
+    def list(self, request, *args, **kwargs):
+        if not settings.FAST_RECIPE_RENDERING:
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(
+            self.get_queryset()).prefetch_related(None).values("id")
+        page = self.paginate_queryset(queryset)
+        return self.get_paginated_response(render_recipes(
+            [row["id"] for row in page], request, thumbnails=True))
+
+    def retrieve(self, request, *args, **kwargs):
+        if not settings.FAST_RECIPE_RENDERING:
+            return super().retrieve(request, *args, **kwargs)
+        pk = self.kwargs[self.lookup_field]
+        data = render_recipes([int(pk)], request) if pk.isdigit() else None
+        if not data:
+            raise Http404
+        return Response(data[0])
+
     @action(detail=True, permission_classes=(IsAuthenticated,))
     def favorite(self, request, pk=None):
         data = {
@@ -92,35 +192,90 @@ class RecipeViewSet(viewsets.ModelViewSet):
             user=user, recipe=get_object_or_404(Recipe, id=pk)).delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
-    @action(detail=False, permission_classes=(IsAuthenticated,))
+    @action(detail=False, methods=["post"],
+            permission_classes=(IsAuthenticated,))
+    def favorite_batch(self, request):
+        return batch_response(request, Favorite)
+
+    @favorite_batch.mapping.delete
+    def delete_favorite_batch(self, request):
+        return batch_response(request, Favorite, delete=True)
+
+    @action(detail=False, methods=["post"],
+            permission_classes=(IsAuthenticated,))
+    def shopping_cart_batch(self, request):
+        return batch_response(request, Cart)
+
+    @shopping_cart_batch.mapping.delete
+    def delete_shopping_cart_batch(self, request):
+        return batch_response(request, Cart, delete=True)
+
+    @action(detail=False, permission_classes=(IsAuthenticated,),
+            renderer_classes=(TextShoppingListRenderer,
+                              CSVShoppingListRenderer,
+                              PDFShoppingListRenderer))
     def download_shopping_cart(self, request):
-        user = request.user
-        cart = user.cart_set.all()
-        shopping_cart_data = {}
-        for item_recipe in cart:
-            ingredients_from_cart = IngredientRecipe.objects.filter(
-                recipe=item_recipe.recipe
-            )
-            for composition in ingredients_from_cart:
-                name = composition.ingredient.name
-                amount = composition.amount
-                measurement_unit = composition.ingredient.measurement_unit
-                if name in shopping_cart_data:
-                    shopping_cart_data[name]["amount"] += amount
-                else:
-                    shopping_cart_data[name] = {
-                        "amount": amount, 
-                        "measurement_unit": measurement_unit
-                    }
-        shopping_list = ([f'{item} - {shopping_cart_data[item]["amount"]} '
-                         f'{shopping_cart_data[item]["measurement_unit"]} \n' 
-                         for item in shopping_cart_data])
-        response = HttpResponse(shopping_list, "Content-Type: text/plain")
-        response["Content-Discription"] = "attachment; filename='shopping_list.txt'"
+        renderer = request.accepted_renderer
+        response = StreamingHttpResponse(
+            export_shopping_list(request.user, renderer),
+            content_type=renderer.content_type
+        )
+        response["Content-Disposition"] = (
+            f"attachment; filename={renderer.filename}.{renderer.format}"
+        )
         return response
 
+    @action(detail=False, permission_classes=(IsAuthenticated,))
+    def feed(self, request):
+        following = get_user_state(request).following
+        if len(following) > settings.FEED_MAX_INLINE_AUTHORS:
+            following = Subsribe.objects.filter(
+                user=request.user).values("author_id")
+        queryset = self.get_queryset().filter(author_id__in=following)
+        paginator = LimitCursorPagination()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        serializer = self.get_serializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(detail=False)
+    def trending(self, request):
+        queryset = self.get_queryset().filter(
+            ranking__trending__gt=0
+        ).order_by("-ranking__trending", "-id")
+        paginator = LimitPagination()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        serializer = self.get_serializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(detail=False)
+    def can_cook(self, request):
+        ingredient_ids = get_ingredient_ids(request)
+        if not ingredient_ids:
+            raise ValidationError(
+                {"ingredients": "Укажите хотя бы один ингредиент."})
+        ranked = recipe_ingredient_index.rank(
+            ingredient_ids, get_max_missing(request))
+        paginator = LimitPagination()
+        page = paginator.paginate_queryset(ranked, request, view=self)
+        recipes = self.get_queryset().in_bulk(
+            [recipe_id for recipe_id, _ in page])
+        found = [(recipes[recipe_id], missing)
+                 for recipe_id, missing in page if recipe_id in recipes]
+        data = self.get_serializer(
+            [recipe for recipe, _ in found], many=True).data
+        for item, (_, missing) in zip(data, found):
+            item["missing_ingredients"] = missing
+        return paginator.get_paginated_response(data)
+
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
+        serializer.instance = self.get_queryset().get(
+            pk=serializer.instance.pk)
+
+    def perform_update(self, serializer):
+        serializer.save()
+        serializer.instance = self.get_queryset().get(
+            pk=serializer.instance.pk)
    
 
 class ListRetrieveViewSet(mixins.ListModelMixin,
@@ -129,17 +284,30 @@ class ListRetrieveViewSet(mixins.ListModelMixin,
     pass
 
 
-class TagViewSet(ListRetrieveViewSet):
+class TagViewSet(CachedResponseMixin, ListRetrieveViewSet):
+    cache_name = "tags"
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = (OwnerOrReadOnly,)
     pagination_class = None
 
 
-class IngredientViewSet(ListRetrieveViewSet):
+class IngredientViewSet(CachedResponseMixin, ListRetrieveViewSet):
+    cache_name = "ingredients"
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     pagination_class = None
     permission_classes = (OwnerOrReadOnly,)
-    filter_backends = (IngredientSearchFilter,)
-    search_fields = ["^name"]
+    filter_backends = ()
+    search_fields = ("^name",)
+
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get("name")
+        if not name:
+            return super().list(request, *args, **kwargs)
+        if not settings.INGREDIENT_SEARCH_INDEX:
+            queryset = IngredientSearchFilter().filter_queryset(
+                request, self.get_queryset(), self)
+            return Response(self.get_serializer(queryset, many=True).data)
+        return Response(ingredient_index.search(
+            name, settings.INGREDIENT_SEARCH_LIMIT))
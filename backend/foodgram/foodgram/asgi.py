@@ -5,3 +5,7 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "foodgram.settings")
 
 application = get_asgi_application()
+
+from api.rankings import start_scheduler  # noqa: E402
+
+start_scheduler()
@@ -25,6 +25,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -65,6 +66,16 @@ DATABASES = {
     }
 }
 
+CACHES = {
+    "default": {
+        "BACKEND": os.environ.get(
+            "CACHE_BACKEND",
+            "django.core.cache.backends.locmem.LocMemCache"
+        ),
+        "LOCATION": os.environ.get("CACHE_LOCATION", "foodgram"),
+    }
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         "NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator",
@@ -98,7 +109,7 @@ REST_FRAMEWORK = {
     ],
 
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "rest_framework.authentication.TokenAuthentication",
+        "api.authentication.CachedTokenAuthentication",
     ],
     "DEFAULT_PAGINATION_CLASS": "api.pagination.LimitPagination",
 
@@ -123,3 +134,87 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'dj_static')
 
 MEDIA_URL = "/dj_media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "dj_media")
+
+SHOPPING_LIST_CACHE_TIMEOUT = int(
+    os.environ.get("SHOPPING_LIST_CACHE_TIMEOUT", 60 * 60 * 24)
+)
+SHOPPING_LIST_PDF_FONT = os.environ.get(
+    "SHOPPING_LIST_PDF_FONT",
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf"
+)
+
+AUTH_TOKEN_CACHE_SIZE = int(os.environ.get("AUTH_TOKEN_CACHE_SIZE", 10000))
+AUTH_TOKEN_CACHE_TIMEOUT = int(os.environ.get("AUTH_TOKEN_CACHE_TIMEOUT", 300))
+AUTH_TOKEN_SHARED_CACHE = os.environ.get("AUTH_TOKEN_SHARED_CACHE", "0") == "1"
+
+USER_STATE_CACHE_TIMEOUT = int(
+    os.environ.get("USER_STATE_CACHE_TIMEOUT", 0)
+)
+
+FAST_RECIPE_RENDERING = os.environ.get("FAST_RECIPE_RENDERING", "1") == "1"
+
+BATCH_MAX_SIZE = int(os.environ.get("BATCH_MAX_SIZE", 100))
+
+FEED_MAX_INLINE_AUTHORS = int(
+    os.environ.get("FEED_MAX_INLINE_AUTHORS", 500)
+)
+
+RANKING_REFRESH_INTERVAL = int(
+    os.environ.get("RANKING_REFRESH_INTERVAL", 60 * 5)
+)
+RANKING_FAVORITE_WEIGHT = int(os.environ.get("RANKING_FAVORITE_WEIGHT", 2))
+RANKING_CART_WEIGHT = int(os.environ.get("RANKING_CART_WEIGHT", 1))
+TRENDING_WINDOW_HOURS = int(os.environ.get("TRENDING_WINDOW_HOURS", 24 * 7))
+RANKING_GAP_TIMEOUT = int(os.environ.get("RANKING_GAP_TIMEOUT", 60 * 60))
+RANKING_MAX_GAPS = int(os.environ.get("RANKING_MAX_GAPS", 10000))
+
+INGREDIENT_SEARCH_LIMIT = int(os.environ.get("INGREDIENT_SEARCH_LIMIT", 50))
+INGREDIENT_SEARCH_INDEX = os.environ.get(
+    "INGREDIENT_SEARCH_INDEX", "1") == "1"
+
+RECIPE_INDEX_MAX_CHANGES = int(
+    os.environ.get("RECIPE_INDEX_MAX_CHANGES", 1000)
+)
+RECIPE_INDEX_CHANGE_TIMEOUT = int(
+    os.environ.get("RECIPE_INDEX_CHANGE_TIMEOUT", 60 * 60 * 24)
+)
+INGREDIENT_INDEX_REBUILD_INTERVAL = int(
+    os.environ.get("INGREDIENT_INDEX_REBUILD_INTERVAL", 60 * 5)
+)
+RECIPE_INDEX_REBUILD_INTERVAL = int(
+    os.environ.get("RECIPE_INDEX_REBUILD_INTERVAL", 60 * 5)
+)
+
+REFERENCE_CACHE_TIMEOUT = int(
+    os.environ.get("REFERENCE_CACHE_TIMEOUT", 60 * 60 * 24)
+)
+
+IMAGE_WORKERS = int(os.environ.get("IMAGE_WORKERS", 2))
+RECIPE_THUMBNAIL_SIZE = (
+    int(os.environ.get("RECIPE_THUMBNAIL_SIZE", 480)),
+) * 2
+RECIPE_WEBP_SIZE = (int(os.environ.get("RECIPE_WEBP_SIZE", 1600)),) * 2
+RECIPE_IMAGE_MAX_SIZE = int(
+    os.environ.get("RECIPE_IMAGE_MAX_SIZE", 10 * 1024 * 1024)
+)
+
+METRICS_DIR = os.environ.get("METRICS_DIR")
+METRICS_FLUSH_INTERVAL = int(os.environ.get("METRICS_FLUSH_INTERVAL", 10))
+N_PLUS_ONE_THRESHOLD = int(os.environ.get("N_PLUS_ONE_THRESHOLD", 10))
+
+SERVER_MODE = os.environ.get("SERVER_MODE", "wsgi")
+ASYNC_READ_VIEWS = SERVER_MODE == "asgi"
+ASYNC_READ_THREADS = int(os.environ.get("ASYNC_READ_THREADS", 16))
+
+DB_CONN_MAX_AGE = int(os.environ.get("DB_CONN_MAX_AGE", 60))
+DB_CONN_HEALTH_CHECKS = os.environ.get("DB_CONN_HEALTH_CHECKS", "1") == "1"
+DB_POOL_SIZE = int(os.environ.get(
+    "DB_POOL_SIZE", ASYNC_READ_THREADS if ASYNC_READ_VIEWS else 0
+))
+if DB_POOL_SIZE and (DATABASES["default"]["ENGINE"] or "").startswith(
+        "django.db.backends.postgresql"):
+    DATABASES["default"]["ENGINE"] = "api.postgresql_pool"
+    DATABASES["default"]["POOL_SIZE"] = DB_POOL_SIZE
+    DATABASES["default"]["CONN_MAX_AGE"] = 0
+else:
+    DATABASES["default"]["CONN_MAX_AGE"] = DB_CONN_MAX_AGE
@@ -1,8 +1,11 @@
 from django.contrib import admin
 from django.urls import include, path
 
+from api.metrics import metrics
+
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("api/auth/", include("djoser.urls.authtoken")),
     path("api/", include("api.urls", namespace="api")),
+    path("metrics/", metrics),
 ]